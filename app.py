@@ -2,29 +2,48 @@
 HiAnime API - Simple anime streaming API
 """
 
+import os
+from typing import Any
+import orjson
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from hianime import HiAnime
+import cache
+from cache import cached
 
 hianime: HiAnime = None
 
+# Episode lists only change when a new episode airs
+EPISODES_CACHE_TTL = 1800
+
 # Valid parameter values
 VALID_SERVERS = ["HD-1", "HD-2", "HD-3", "StreamTape"]
 VALID_TYPES = ["sub", "dub", "raw", "mixed"]
 
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which writes bytes directly"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global hianime
     hianime = HiAnime()
+    await cache.connect(os.environ.get("REDIS_URL"))
     yield
     await hianime.close()
+    await cache.close()
 
 
 app = FastAPI(
     title="HiAnime API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -56,6 +75,7 @@ async def search(q: str = Query(..., min_length=1, description="Search query"),
 
 
 @app.get("/popular")
+@cached("short")
 async def popular(page: int = Query(1, ge=1, description="Page number")):
     """Most popular anime"""
     result = await hianime.get_popular(page)
@@ -67,6 +87,7 @@ async def popular(page: int = Query(1, ge=1, description="Page number")):
 
 
 @app.get("/latest")
+@cached("short")
 async def latest(page: int = Query(1, ge=1, description="Page number")):
     """Recently updated anime"""
     result = await hianime.get_latest(page)
@@ -78,6 +99,7 @@ async def latest(page: int = Query(1, ge=1, description="Page number")):
 
 
 @app.get("/info/{anime_id}")
+@cached("long")
 async def info(anime_id: str):
     """Get anime details"""
     result = await hianime.get_anime_details(anime_id)
@@ -90,9 +112,17 @@ async def info(anime_id: str):
 
 
 @app.get("/episodes/{anime_id}")
-async def episodes(anime_id: str):
+async def episodes(anime_id: str, refresh: bool = Query(False, description="Bypass the cache")):
     """Get all episodes for an anime"""
-    result = await hianime.get_episodes(anime_id)
+    # Keyed on the numeric ID, which stays the same if the slug changes
+    numeric_id = anime_id.split("-")[-1]
+    result = await cache.remember(
+        f"eps:{numeric_id}",
+        EPISODES_CACHE_TTL,
+        lambda: hianime.get_episodes(anime_id),
+        keep=lambda r: bool(r.get("episodes")),
+        refresh=refresh,
+    )
     if result.get("error"):
         error_msg = result["error"]
         if "invalid" in error_msg.lower():
@@ -102,10 +132,13 @@ async def episodes(anime_id: str):
         raise HTTPException(status_code=503, detail=error_msg)
     if not result.get("episodes"):
         raise HTTPException(status_code=404, detail=f"No episodes found for anime '{anime_id}'")
+    # The cached list may have been loaded under another slug
+    result["anime_id"] = anime_id
     return result
 
 
 @app.get("/servers/{episode_id}")
+@cached("normal")
 async def servers(episode_id: str):
     """Get available servers for an episode"""
     result = await hianime.get_episode_servers(episode_id)
@@ -0,0 +1,194 @@
+"""
+Response cache for HiAnime API - kept in Redis, or in memory when Redis is
+not configured
+"""
+
+import asyncio
+import functools
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import orjson
+from fastapi import HTTPException, Response
+
+from ttl_cache import TTLCache
+
+try:
+    from redis.asyncio import Redis
+    from redis.exceptions import RedisError
+except ImportError:
+    Redis = None
+    RedisError = OSError
+
+
+# How long a cached response stays fresh (seconds), per policy
+CACHE_POLICIES = {
+    "short": 60,       # listings like /popular, /latest
+    "normal": 1800,    # episode and server lists
+    "long": 86400,     # anime details
+}
+
+# How long a stale response is kept to serve when upstream is down
+STALE_GRACE = 6 * 3600
+
+# Most responses kept by the in-memory backend
+MEMORY_CACHE_SIZE = 1024
+
+_redis: Optional["Redis"] = None
+_memory: Optional["TTLCache"] = None
+
+# Keys being refreshed in the background, and the tasks doing it
+_refreshing: set = set()
+_background_tasks: set = set()
+
+
+async def connect(url: Optional[str]) -> None:
+    """Connect to Redis, or keep responses in memory without a URL or the redis package"""
+    global _redis, _memory
+    if url and Redis is not None:
+        _redis = Redis.from_url(url)
+    else:
+        _memory = TTLCache(max(CACHE_POLICIES.values()) + STALE_GRACE, MEMORY_CACHE_SIZE)
+
+
+async def close() -> None:
+    """Close the Redis connection and drop in-memory responses"""
+    global _redis, _memory
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+    _memory = None
+
+
+def _enabled() -> bool:
+    return _redis is not None or _memory is not None
+
+
+def _make_key(name: str, params: Dict[str, Any]) -> str:
+    """Build a cache key from the endpoint name and its path/query parameters"""
+    raw = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+    return f"resp:{name}:{hashlib.sha1(raw).hexdigest()}"
+
+
+async def _load(key: str) -> Dict[bytes, Any]:
+    """Fetch a stored entry as a Redis-style hash; empty when missing"""
+    if _redis is None:
+        return _memory.get(key) or {}
+    try:
+        return await _redis.hgetall(key)
+    except RedisError:
+        return {}
+
+
+async def _store(key: str, body: bytes, ttl: float, **fields: Any) -> None:
+    """Store a JSON body with its freshness window; kept for STALE_GRACE after going stale"""
+    now = time.time()
+    if _redis is None:
+        # Expires like the Redis key; stale_at still decides freshness
+        _memory.set(key, {
+            b"body": body,
+            b"generated_at": now,
+            b"stale_at": now + ttl,
+            **{k.encode(): v for k, v in fields.items()},
+        }, ttl + STALE_GRACE)
+        return
+    try:
+        async with _redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "body": body,
+                "generated_at": now,
+                "stale_at": now + ttl,
+                **fields,
+            })
+            pipe.expire(key, int(ttl + STALE_GRACE))
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def _revalidate(key: str, ttl: float, loader: Callable[[], Awaitable[Any]],
+                      keep: Callable[[Any], bool]) -> None:
+    try:
+        value = await loader()
+        if keep(value):
+            await _store(key, orjson.dumps(value), ttl)
+    except Exception as e:
+        print(f"Cache refresh failed for {key}: {e}")
+    finally:
+        _refreshing.discard(key)
+
+
+async def remember(key: str, ttl: float, loader: Callable[[], Awaitable[Any]],
+                   keep: Callable[[Any], bool] = bool, refresh: bool = False) -> Any:
+    """
+    Return the value cached under `key`, loading and storing it on a miss.
+    
+    Stale entries are returned right away while a background task reloads
+    them (stale-while-revalidate). Only values for which `keep(value)` is
+    true are stored. `refresh` skips the cached copy and reloads now.
+    """
+    if not _enabled():
+        return await loader()
+    
+    entry = {} if refresh else await _load(key)
+    
+    if entry:
+        if float(entry[b"stale_at"]) <= time.time() and key not in _refreshing:
+            _refreshing.add(key)
+            task = asyncio.create_task(_revalidate(key, ttl, loader, keep))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return orjson.loads(entry[b"body"])
+    
+    value = await loader()
+    if keep(value):
+        await _store(key, orjson.dumps(value), ttl)
+    return value
+
+
+def _json_response(body: bytes, status_code: int, cache_status: str) -> Response:
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"X-Cache": cache_status},
+    )
+
+
+def cached(policy: str = "normal") -> Callable:
+    """
+    Cache a GET endpoint's JSON response in Redis or memory.
+    
+    Fresh hits skip the handler entirely. When the handler fails with a 503
+    (upstream unreachable), a stale copy is served instead if one is kept.
+    Error responses are never cached.
+    """
+    ttl = CACHE_POLICIES[policy]
+    
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            if not _enabled():
+                return await func(**kwargs)
+            
+            key = _make_key(func.__name__, kwargs)
+            entry = await _load(key)
+            
+            if entry and float(entry[b"stale_at"]) > time.time():
+                return _json_response(entry[b"body"], int(entry[b"code"]), "HIT")
+            
+            try:
+                result = await func(**kwargs)
+            except HTTPException as e:
+                if e.status_code == 503 and entry:
+                    return _json_response(entry[b"body"], int(entry[b"code"]), "STALE")
+                raise
+            
+            body = orjson.dumps(result)
+            await _store(key, body, ttl, code=200)
+            return _json_response(body, 200, "MISS")
+        
+        return wrapper
+    
+    return decorator
@@ -0,0 +1,63 @@
+"""
+Shared HTTP client for the video extractors
+"""
+
+import asyncio
+from types import MappingProxyType
+from typing import Optional
+
+import httpx
+
+from limits import HostRateLimiter
+
+
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Sent with every extractor request; per-request headers are merged over these
+_DEFAULT_HEADERS = MappingProxyType({"User-Agent": _USER_AGENT})
+
+# Requests per second allowed to each host, to stay clear of upstream 429s
+DEFAULT_HOST_RATE = 10
+HOST_RATES = {
+    "raw.githubusercontent.com": 2,
+}
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide client, creating it on first use.
+    Embed pages, sources, playlists and the decrypt API are fetched over the
+    same pooled HTTP/2 connections, so requests to one host multiplex on a
+    single connection instead of waiting for a free keep-alive slot.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        rate_limiter = HostRateLimiter(DEFAULT_HOST_RATE, HOST_RATES)
+        
+        async def throttle(request: httpx.Request) -> None:
+            await rate_limiter.acquire(request.url.host)
+        
+        _client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            headers=_DEFAULT_HEADERS,
+            # Every request waits for its host's rate limit before it is sent
+            event_hooks={"request": [throttle]},
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client"""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
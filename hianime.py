@@ -2,16 +2,179 @@
 HiAnime - Python port of the Kotlin Aniyomi Extension https://github.com/yuzono/aniyomi-extensions
 """
 
-import aiohttp
+import httpx
+import orjson
 import asyncio
-from bs4 import BeautifulSoup
-from typing import Optional, List, Dict, Any
+import functools
+import operator
+import os
+import re
+import time
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Iterator, Mapping, Tuple
 from urllib.parse import urlencode, quote
-import json
 
+from ttl_cache import TTLCache
+from limits import ConcurrencyLimiter
 from megacloud_extractor import MegaCloudExtractor
 from streamtape_extractor import StreamTapeExtractor
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Request headers, built once and shared read-only by every request
+_BASE_HEADERS = MappingProxyType({
+    "User-Agent": _USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+})
+_API_HEADERS = MappingProxyType({
+    "User-Agent": _USER_AGENT,
+    "Accept": "*/*",
+    "X-Requested-With": "XMLHttpRequest",
+})
+
+# CSS selectors for anime cards on listing pages
+_SEL_CARD = "div.flw-item"
+_SEL_CARD_DETAIL = "div.film-detail a"
+_SEL_CARD_POSTER = "div.film-poster > img"
+_SEL_NEXT_PAGE = "li.page-item a[title=Next]"
+
+# Server types, and the class of the block that holds each type's servers
+SERVER_TYPES = ("sub", "dub", "raw", "mixed")
+_SERVER_BLOCK_TYPES = {f"servers-{type_key}": type_key for type_key in SERVER_TYPES}
+# Order in which get_video looks for a server in the other types
+_FALLBACK_TYPE_ORDER = ("sub", "dub", "mixed", "raw")
+
+# Regexes for picking one server out of the raw servers fragment without a DOM.
+# A block runs from its servers-{type} class to the close of its server list.
+_SERVER_BLOCK_RES = {
+    type_key: re.compile(rf'servers-{type_key}"(.*?)</div>\s*</div>', re.S)
+    for type_key in SERVER_TYPES
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_css(selector: str):
+    """Compile a CSS selector to an lxml XPath matcher once per selector string"""
+    from lxml.cssselect import CSSSelector
+    return CSSSelector(selector, translator="html")
+
+
+class _LxmlNode:
+    """
+    Minimal selectolax-style wrapper over an lxml element.
+    Only used when selectolax is not installed.
+    """
+    
+    __slots__ = ("_el",)
+    
+    def __init__(self, el):
+        self._el = el
+    
+    @property
+    def tag(self) -> str:
+        return self._el.tag
+    
+    @property
+    def attributes(self):
+        return self._el.attrib
+    
+    @property
+    def parent(self) -> Optional["_LxmlNode"]:
+        parent = self._el.getparent()
+        return _LxmlNode(parent) if parent is not None else None
+    
+    def css(self, selector: str) -> List["_LxmlNode"]:
+        return [_LxmlNode(el) for el in _compile_css(selector)(self._el)]
+    
+    def css_first(self, selector: str) -> Optional["_LxmlNode"]:
+        matches = _compile_css(selector)(self._el)
+        return _LxmlNode(matches[0]) if matches else None
+    
+    def iter(self):
+        for el in self._el.iterchildren():
+            if isinstance(el.tag, str):
+                yield _LxmlNode(el)
+    
+    def traverse(self):
+        for el in self._el.iter():
+            if isinstance(el.tag, str):
+                yield _LxmlNode(el)
+    
+    def text(self, strip: bool = False) -> str:
+        if strip:
+            return "".join(t.strip() for t in self._el.itertext())
+        return self._el.text_content()
+
+
+def _card_nodes(card):
+    """
+    Find an anime card's title link and poster image.
+    Walks the card's fixed film-poster/film-detail layout directly, which is
+    cheaper than compiling and running a selector per field; falls back to
+    CSS selectors if the layout doesn't match.
+    """
+    detail = poster = None
+    for child in card.iter():
+        classes = (child.attributes.get("class") or "").split()
+        if "film-poster" in classes:
+            poster = next((node for node in child.iter() if node.tag == "img"), None)
+        elif "film-detail" in classes:
+            detail = next((node for node in child.traverse() if node.tag == "a"), None)
+    
+    if detail is None:
+        detail = card.css_first(_SEL_CARD_DETAIL)
+    if poster is None:
+        poster = card.css_first(_SEL_CARD_POSTER)
+    return detail, poster
+
+
+@functools.lru_cache(maxsize=None)
+def _server_item_re(server: str) -> "re.Pattern":
+    """Match a server item by name, capturing its data-id"""
+    return re.compile(
+        rf'data-id="([^"]+)"[^>]*>\s*(?:<a\b[^>]*>\s*)?{re.escape(server)}\s*<',
+        re.I,
+    )
+
+
+def _find_server_id(html: str, server: str, type: str) -> Optional[str]:
+    """Find a server's data-id in a servers fragment by regex; None if the markup doesn't match"""
+    block_re = _SERVER_BLOCK_RES.get(type)
+    if block_re is None:
+        return None
+    block = block_re.search(html)
+    if not block:
+        return None
+    item = _server_item_re(server).search(block.group(1))
+    return item.group(1) if item else None
+
+
+def _server_block_type(item) -> Optional[str]:
+    """Find which servers-{type} block a server item sits in"""
+    node = item.parent
+    while node is not None:
+        for cls in (node.attributes.get("class") or "").split():
+            type_key = _SERVER_BLOCK_TYPES.get(cls)
+            if type_key:
+                return type_key
+        node = node.parent
+    return None
+
+
+def _parse(html: str):
+    """Build a DOM for an HTML page or AJAX fragment - Lexbor, else lxml"""
+    if LexborHTMLParser is not None:
+        return LexborHTMLParser(html)
+    from lxml import html as lxml_html
+    return _LxmlNode(lxml_html.document_fromstring(html or "<html></html>"))
+
 
 class HiAnime:
     """
@@ -32,77 +195,155 @@ class HiAnime:
         "hianimez.is",
     ]
     
-    HOSTER_NAMES = ["HD-1", "HD-2", "HD-3", "StreamTape"]
+    HOSTER_NAMES = frozenset(("HD-1", "HD-2", "HD-3", "StreamTape"))
+    
+    # Upstream responses are reused for this long (seconds), keyed on URL
+    FETCH_CACHE_TTL = 60
+    FETCH_CACHE_SIZE = 256
+    
+    # Source links resolved per server ID
+    SOURCE_LINK_TTL = 90
+    SOURCE_LINK_CACHE_SIZE = 1024
+    
+    # Max concurrent requests to HiAnime, to stay clear of upstream rate limiting
+    MAX_CONCURRENCY = int(os.environ.get("HIANIME_MAX_CONC", "12"))
+    
+    # A domain that fails is skipped for this long (seconds)
+    DOMAIN_COOLDOWN = 60
+    # Domains tried per request before giving up
+    MAX_DOMAIN_ATTEMPTS = 3
     
     def __init__(self, base_url: str = "https://hianime.to"):
         self.base_url = base_url
         self.ajax_route = "/v2"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Domain failover: the configured domain first, then the mirrors.
+        # Maps each domain to the time it is considered unhealthy until.
+        base_domain = base_url.split("://", 1)[-1].rstrip("/")
+        self._domains = [base_domain] + [d for d in self.DOMAINS if d != base_domain]
+        self._domain_state: Dict[str, float] = {d: 0.0 for d in self._domains}
+        self._current_domain = base_domain
+        
+        # Coalesces concurrent requests for the same URL into one upstream fetch
+        self._html_cache = TTLCache(self.FETCH_CACHE_TTL, self.FETCH_CACHE_SIZE)
+        self._json_cache = TTLCache(self.FETCH_CACHE_TTL, self.FETCH_CACHE_SIZE)
+        self._source_cache = TTLCache(self.SOURCE_LINK_TTL, self.SOURCE_LINK_CACHE_SIZE, refresh_ahead=0.8)
+        self._limiter = ConcurrencyLimiter(self.MAX_CONCURRENCY)
         
         # Extractors
         self.megacloud_extractor = MegaCloudExtractor()
         self.streamtape_extractor = StreamTapeExtractor()
     
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                headers=self._get_headers()
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            # HTTP/2 multiplexes concurrent requests over one connection per host
+            self._client = httpx.AsyncClient(
+                http2=True,
+                headers=self._get_headers(),
+                follow_redirects=True,
+                timeout=httpx.Timeout(20.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
             )
-        return self._session
+        return self._client
     
-    def _get_headers(self, referer: Optional[str] = None) -> Dict[str, str]:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
-        }
-        if referer:
-            headers["Referer"] = referer
-        return headers
+    def set_concurrency(self, limit: int) -> None:
+        """Change the max number of concurrent requests to HiAnime at runtime"""
+        self._limiter.set_limit(limit)
     
-    def _get_api_headers(self, referer: str) -> Dict[str, str]:
-        return {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-            "Referer": referer,
-            "X-Requested-With": "XMLHttpRequest",
-        }
+    def _get_headers(self, referer: Optional[str] = None) -> Mapping[str, str]:
+        if not referer:
+            return _BASE_HEADERS
+        return {**_BASE_HEADERS, "Referer": referer}
     
-    async def _fetch(self, url: str, headers: Optional[Dict] = None) -> str:
-        session = await self._get_session()
-        async with session.get(url, headers=headers or self._get_headers()) as response:
-            response.raise_for_status()
-            return await response.text()
+    def _get_api_headers(self, referer: str) -> Mapping[str, str]:
+        return {**_API_HEADERS, "Referer": referer}
     
-    async def _fetch_json(self, url: str, headers: Optional[Dict] = None) -> Dict:
-        session = await self._get_session()
-        async with session.get(url, headers=headers or self._get_headers()) as response:
+    def _candidate_domains(self) -> List[str]:
+        """Domains to try, last known-good first, skipping ones cooling down"""
+        now = time.monotonic()
+        ordered = [self._current_domain] + [d for d in self._domains if d != self._current_domain]
+        healthy = [d for d in ordered if self._domain_state[d] <= now]
+        # If every domain is cooling down, try them anyway rather than fail outright
+        return (healthy or ordered)[:self.MAX_DOMAIN_ATTEMPTS]
+    
+    async def _get(self, url: str, headers: Mapping[str, str]) -> httpx.Response:
+        """
+        GET a HiAnime URL, failing over to mirror domains.
+        A domain that errors or answers 5xx is put on cooldown and the next one tried.
+        """
+        client = await self._get_client()
+        if not url.startswith(self.base_url):
+            async with self._limiter:
+                return await client.get(url, headers=headers)
+        
+        path = url[len(self.base_url):]
+        referer = headers.get("Referer", "")
+        last_error: Optional[httpx.HTTPError] = None
+        response = None
+        
+        for domain in self._candidate_domains():
+            base = f"https://{domain}"
+            domain_headers = headers
+            if referer.startswith(self.base_url):
+                domain_headers = {**headers, "Referer": base + referer[len(self.base_url):]}
+            
+            try:
+                async with self._limiter:
+                    response = await client.get(base + path, headers=domain_headers)
+            except httpx.TransportError as e:
+                last_error = e
+            else:
+                if response.status_code < 500:
+                    self._current_domain = domain
+                    return response
+            self._domain_state[domain] = time.monotonic() + self.DOMAIN_COOLDOWN
+        
+        # Every attempt failed: surface the last 5xx, else the last network error
+        if response is not None:
+            return response
+        raise last_error
+    
+    async def _fetch(self, url: str, headers: Optional[Mapping[str, str]] = None) -> str:
+        async def load() -> str:
+            response = await self._get(url, headers or self._get_headers())
             response.raise_for_status()
-            return await response.json()
+            return response.text
+        return await self._html_cache.get_or_load(url, load)
+    
+    async def _get_json(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Dict:
+        response = await self._get(url, headers or self._get_headers())
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
+    async def _fetch_json(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Dict:
+        return await self._json_cache.get_or_load(url, lambda: self._get_json(url, headers))
     
     def _parse_anime_element(self, element, use_english: bool = False) -> Dict[str, Any]:
         """Parse anime from HTML element - mirrors popularAnimeFromElement"""
-        detail = element.select_one("div.film-detail a")
-        poster = element.select_one("div.film-poster > img")
+        detail, poster = _card_nodes(element)
         
-        href = detail.get("href", "") if detail else ""
+        # Lexbor builds a new attributes dict on every access, so read it once
+        detail_attrs = detail.attributes if detail else {}
+        
+        href = detail_attrs.get("href") or ""
         # Remove query string like in Kotlin: url.substringBefore("?")
-        url = href.split("?")[0] if href else ""
+        url = href.partition("?")[0]
         
         # Get title - prefer English if available, else use Japanese
-        if use_english and detail and detail.has_attr("title"):
-            title = detail.get("title", "")
+        if use_english and "title" in detail_attrs:
+            title = detail_attrs.get("title") or ""
         else:
-            title = detail.get("data-jname", "") if detail else ""
+            title = detail_attrs.get("data-jname") or ""
         
         # Fallback to text content if no attributes
         if not title and detail:
-            title = detail.get_text(strip=True)
+            title = detail.text(strip=True)
         
-        thumbnail = poster.get("data-src", "") if poster else ""
+        thumbnail = (poster.attributes.get("data-src") or "") if poster else ""
         
         # Extract anime ID from URL
-        anime_id = url.split("/")[-1] if url else ""
+        anime_id = url.rpartition("/")[2]
         
         return {
             "id": anime_id,
@@ -111,28 +352,28 @@ class HiAnime:
             "thumbnail": thumbnail,
         }
     
-    def _has_next_page(self, soup: BeautifulSoup) -> bool:
+    def _has_next_page(self, tree) -> bool:
         """Check if there's a next page - mirrors popularAnimeNextPageSelector"""
-        return soup.select_one("li.page-item a[title=Next]") is not None
+        return tree.css_first(_SEL_NEXT_PAGE) is not None
     
     async def search(self, query: str, page: int = 1) -> Dict[str, Any]:
         """Search for anime - mirrors searchAnimeRequest"""
         url = f"{self.base_url}/search?keyword={quote(query)}&page={page}"
         try:
             html = await self._fetch(url)
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}", "results": []}
-        soup = BeautifulSoup(html, "html.parser")
+        tree = _parse(html)
         
         results = []
-        for element in soup.select("div.flw-item"):
+        for element in tree.css(_SEL_CARD):
             anime = self._parse_anime_element(element)
             if anime["id"]:
                 results.append(anime)
         
         return {
             "results": results,
-            "has_next_page": self._has_next_page(soup),
+            "has_next_page": self._has_next_page(tree),
             "page": page,
         }
     
@@ -141,19 +382,19 @@ class HiAnime:
         url = f"{self.base_url}/most-popular?page={page}"
         try:
             html = await self._fetch(url)
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}", "results": []}
-        soup = BeautifulSoup(html, "html.parser")
+        tree = _parse(html)
         
         results = []
-        for element in soup.select("div.flw-item"):
+        for element in tree.css(_SEL_CARD):
             anime = self._parse_anime_element(element)
             if anime["id"]:
                 results.append(anime)
         
         return {
             "results": results,
-            "has_next_page": self._has_next_page(soup),
+            "has_next_page": self._has_next_page(tree),
             "page": page,
         }
     
@@ -162,19 +403,19 @@ class HiAnime:
         url = f"{self.base_url}/recently-updated?page={page}"
         try:
             html = await self._fetch(url)
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}", "results": []}
-        soup = BeautifulSoup(html, "html.parser")
+        tree = _parse(html)
         
         results = []
-        for element in soup.select("div.flw-item"):
+        for element in tree.css(_SEL_CARD):
             anime = self._parse_anime_element(element)
             if anime["id"]:
                 results.append(anime)
         
         return {
             "results": results,
-            "has_next_page": self._has_next_page(soup),
+            "has_next_page": self._has_next_page(tree),
             "page": page,
         }
     
@@ -186,17 +427,17 @@ class HiAnime:
         
         url = f"{self.base_url}/filter?{urlencode(params)}"
         html = await self._fetch(url)
-        soup = BeautifulSoup(html, "html.parser")
+        tree = _parse(html)
         
         results = []
-        for element in soup.select("div.flw-item"):
+        for element in tree.css(_SEL_CARD):
             anime = self._parse_anime_element(element)
             if anime["id"]:
                 results.append(anime)
         
         return {
             "results": results,
-            "has_next_page": self._has_next_page(soup),
+            "has_next_page": self._has_next_page(tree),
             "page": page,
             "filters": filters or {},
         }
@@ -206,35 +447,40 @@ class HiAnime:
         url = f"{self.base_url}/{anime_id}"
         try:
             html = await self._fetch(url)
-        except aiohttp.ClientResponseError as e:
-            if e.status == 404:
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 return {"error": f"Anime '{anime_id}' not found"}
-            return {"error": f"Failed to fetch anime details: HTTP {e.status}"}
-        except aiohttp.ClientError as e:
+            return {"error": f"Failed to fetch anime details: HTTP {e.response.status_code}"}
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}"}
-        soup = BeautifulSoup(html, "html.parser")
+        tree = _parse(html)
         
         # Check if the page is a valid anime page
-        title_elem = soup.select_one("h2.film-name")
+        title_elem = tree.css_first("h2.film-name")
         if not title_elem:
             return {"error": f"Anime '{anime_id}' not found"}
         
         # Get thumbnail
-        poster = soup.select_one("div.anisc-poster img")
-        thumbnail = poster.get("src", "") if poster else ""
-        
-        # Get info section
-        info = soup.select_one("div.anisc-info")
-        
-        def get_info(tag: str, is_list: bool = False) -> Optional[str]:
-            if is_list:
-                items = info.select(f"div.item-list:contains('{tag}') > a") if info else []
-                return ", ".join([item.get_text(strip=True) for item in items]) or None
-            item = info.select_one(f"div.item-title:contains('{tag}')") if info else None
-            if item:
-                name = item.select_one(".name, .text")
-                return name.get_text(strip=True) if name else None
-            return None
+        poster = tree.css_first("div.anisc-poster img")
+        thumbnail = (poster.attributes.get("src") or "") if poster else ""
+        
+        # Collect the info section in one pass, keyed by its "Label:" head.
+        # Lexbor has no :contains(), and one walk beats a selector per field.
+        info_items: Dict[str, str] = {}
+        for item in tree.css("div.anisc-info div.item"):
+            head = item.css_first(".item-head")
+            if not head:
+                continue
+            label = head.text(strip=True)
+            if "item-list" in (item.attributes.get("class") or "").split():
+                values = [a.text(strip=True) for a in item.iter() if a.tag == "a"]
+                info_items[label] = ", ".join(values)
+            else:
+                name = item.css_first(".name, .text")
+                info_items[label] = name.text(strip=True) if name else ""
+        
+        def get_info(tag: str) -> Optional[str]:
+            return info_items.get(tag) or None
         
         # Parse status
         status_text = get_info("Status:")
@@ -268,11 +514,11 @@ class HiAnime:
             description_parts.append(f"\nJapanese: {japanese}")
         
         # Get title (title_elem already validated above)
-        title = title_elem.get_text(strip=True)
+        title = title_elem.text(strip=True)
         
         # Get Japanese title
-        jp_title_elem = soup.select_one("h2.film-name[data-jname]")
-        jp_title = jp_title_elem.get("data-jname", "") if jp_title_elem else ""
+        jp_title_elem = tree.css_first("h2.film-name[data-jname]")
+        jp_title = (jp_title_elem.attributes.get("data-jname") or "") if jp_title_elem else ""
         
         return {
             "id": anime_id,
@@ -281,11 +527,38 @@ class HiAnime:
             "thumbnail": thumbnail,
             "status": status,
             "studios": get_info("Studios:"),
-            "genres": get_info("Genres:", is_list=True),
+            "genres": get_info("Genres:"),
             "description": "".join(description_parts),
             "url": f"{self.base_url}/{anime_id}",
         }
     
+    def _iter_episodes(self, tree) -> Iterator[Dict[str, Any]]:
+        """Yield episodes from an episode list fragment - mirrors episodeFromElement"""
+        for element in tree.css("a.ep-item"):
+            # Read the attribute dict once per element rather than once per field
+            attrs = element.attributes
+            ep_num_str = attrs.get("data-number", "1")
+            href = attrs.get("href") or ""
+            
+            # Parse episode number (handles 1, 1.5, etc.)
+            try:
+                ep_num = float(ep_num_str) if ep_num_str else 1.0
+            except ValueError:
+                ep_num = 1.0
+            
+            # Extract episode ID from href (e.g., "/watch/anime?ep=12345" -> "12345")
+            _, sep, episode_id = href.rpartition("?ep=")
+            if not sep:
+                episode_id = attrs.get("data-id") or ""
+            
+            yield {
+                "id": episode_id,
+                "number": ep_num,
+                "title": f"Ep. {ep_num_str}: {attrs.get('title') or ''}",
+                "is_filler": "ssl-item-filler" in (attrs.get("class") or "").split(),
+                "url": href,
+            }
+    
     async def get_episodes(self, anime_id: str) -> Dict[str, Any]:
         """Get all episodes for an anime - mirrors episodeListRequest/episodeListParse"""
         # Extract numeric ID from anime_id (e.g., "boruto-123" -> "123")
@@ -300,48 +573,21 @@ class HiAnime:
         
         try:
             data = await self._fetch_json(url, self._get_api_headers(referer))
-        except aiohttp.ClientResponseError as e:
-            if e.status == 404:
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 return {"error": f"Anime '{anime_id}' not found"}
-            return {"error": f"Failed to fetch episodes: HTTP {e.status}"}
-        except aiohttp.ClientError as e:
+            return {"error": f"Failed to fetch episodes: HTTP {e.response.status_code}"}
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}"}
+        except orjson.JSONDecodeError:
+            return {"error": "Unexpected response from server"}
         
         html = data.get("html", "")
         if not html:
             return {"error": f"Anime '{anime_id}' not found or has no episodes"}
         
-        soup = BeautifulSoup(html, "html.parser")
-        
-        episodes = []
-        for element in soup.select("a.ep-item"):
-            ep_num_str = element.get("data-number", "1")
-            ep_title = element.get("title", "")
-            ep_id = element.get("data-id", "")
-            href = element.get("href", "")
-            
-            # Parse episode number (handles 1, 1.5, etc.)
-            try:
-                ep_num = float(ep_num_str) if ep_num_str else 1.0
-            except ValueError:
-                ep_num = 1.0
-            
-            # Check if filler episode
-            is_filler = "ssl-item-filler" in element.get("class", [])
-            
-            # Extract episode ID from href (e.g., "/watch/anime?ep=12345" -> "12345")
-            episode_id = href.split("?ep=")[-1] if "?ep=" in href else ep_id
-            
-            episodes.append({
-                "id": episode_id,
-                "number": ep_num,
-                "title": f"Ep. {ep_num_str}: {ep_title}",
-                "is_filler": is_filler,
-                "url": href,
-            })
-        
         # Sort by episode number ascending (1, 1.5, 2, 3...)
-        episodes.sort(key=lambda x: x["number"])
+        episodes = sorted(self._iter_episodes(_parse(html)), key=operator.itemgetter("number"))
         
         return {
             "anime_id": anime_id,
@@ -349,8 +595,8 @@ class HiAnime:
             "episodes": episodes,
         }
     
-    async def get_episode_servers(self, episode_id: str, type_filter: Optional[str] = None) -> Dict[str, Any]:
-        """Get available servers for an episode - mirrors videoListRequest"""
+    async def _fetch_servers_html(self, episode_id: str) -> Dict[str, Any]:
+        """Fetch the servers fragment for an episode, as {"html": ...} or {"error": ...}"""
         # Validate episode_id is numeric
         if not episode_id.isdigit():
             return {"error": f"Invalid episode ID '{episode_id}'. Episode ID must be numeric."}
@@ -360,94 +606,109 @@ class HiAnime:
         
         try:
             data = await self._fetch_json(url, self._get_api_headers(referer))
-        except aiohttp.ClientResponseError as e:
-            if e.status == 404:
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 return {"error": f"Episode '{episode_id}' not found"}
-            return {"error": f"Failed to fetch servers: HTTP {e.status}"}
-        except aiohttp.ClientError as e:
+            return {"error": f"Failed to fetch servers: HTTP {e.response.status_code}"}
+        except httpx.HTTPError as e:
             return {"error": f"Failed to connect to server: {str(e)}"}
+        except orjson.JSONDecodeError:
+            return {"error": "Unexpected response from server"}
         
         html = data.get("html", "")
         if not html:
             return {"error": f"Episode '{episode_id}' not found"}
+        return {"html": html}
+    
+    def _parse_servers(self, tree, type_filter: Optional[str] = None,
+                       index: Optional[Dict[Tuple[str, str], Dict[str, str]]] = None) -> Dict[str, List[Dict[str, str]]]:
+        """
+        Bucket the servers in a servers fragment by type.
+        If `index` is given, it is filled with (lowercase name, type) -> server.
+        """
+        servers = {type_key: [] for type_key in SERVER_TYPES}
         
-        soup = BeautifulSoup(html, "html.parser")
-        
-        servers = {
-            "sub": [],
-            "dub": [],
-            "raw": [],
-            "mixed": [],
-        }
-        
-        type_mapping = {
-            "servers-sub": "sub",
-            "servers-dub": "dub", 
-            "servers-raw": "raw",
-            "servers-mixed": "mixed",
-        }
+        if type_filter:
+            if type_filter not in servers:
+                return servers
+            types = (type_filter,)
+        else:
+            types = SERVER_TYPES
         
-        for server_type, type_key in type_mapping.items():
-            if type_filter and type_filter != type_key:
+        # One pass over the tree for all requested types, in document order
+        selector = ", ".join(f"div.servers-{type_key} div.item" for type_key in types)
+        for item in tree.css(selector):
+            server_name = item.text(strip=True)
+            if server_name not in self.HOSTER_NAMES:
+                continue
+            
+            type_key = type_filter or _server_block_type(item)
+            if type_key is None:
                 continue
-                
-            for item in soup.select(f"div.{server_type} div.item"):
-                server_id = item.get("data-id", "")
-                server_name = item.get_text(strip=True)
-                data_type = item.get("data-type", type_key)
-                
-                if server_name in self.HOSTER_NAMES:
-                    servers[type_key].append({
-                        "id": server_id,
-                        "name": server_name,
-                        "type": data_type,
-                    })
+            
+            attrs = item.attributes
+            entry = {
+                "id": attrs.get("data-id") or "",
+                "name": server_name,
+                "type": attrs.get("data-type") or type_key,
+            }
+            servers[type_key].append(entry)
+            if index is not None:
+                index.setdefault((server_name.lower(), type_key), entry)
+        
+        return servers
+    
+    async def get_episode_servers(self, episode_id: str, type_filter: Optional[str] = None) -> Dict[str, Any]:
+        """Get available servers for an episode - mirrors videoListRequest"""
+        data = await self._fetch_servers_html(episode_id)
+        if data.get("error"):
+            return data
         
         return {
             "episode_id": episode_id,
-            "servers": servers,
+            "servers": self._parse_servers(_parse(data["html"]), type_filter),
         }
     
     async def _get_server_source_link(self, server_id: str, referer: str) -> str:
         """Get the source link for a server - mirrors sources fetch in getVideoList"""
-        url = f"{self.base_url}/ajax{self.ajax_route}/episode/sources?id={server_id}"
-        data = await self._fetch_json(url, self._get_api_headers(referer))
-        return data.get("link", "")
+        async def load() -> str:
+            url = f"{self.base_url}/ajax{self.ajax_route}/episode/sources?id={server_id}"
+            data = await self._get_json(url, self._get_api_headers(referer))
+            return data.get("link", "")
+        # Links stay valid for minutes, so reuse them and refresh ahead of expiry
+        return await self._source_cache.get_or_load(server_id, load, keep=bool)
     
     async def get_video(self, episode_id: str, server: str = "HD-1", type: str = "sub") -> Dict[str, Any]:
         """Get video URL from a specific server - mirrors extractVideo"""
-        # First get servers
-        servers_data = await self.get_episode_servers(episode_id, type)
-        
-        # Find the requested server
-        type_servers = servers_data["servers"].get(type, [])
-        target_server = None
-        
-        for s in type_servers:
-            if s["name"].lower() == server.lower():
-                target_server = s
-                break
-        
-        if not target_server:
-            # Try to find any matching server in any type if not found
-            for t in ["sub", "dub", "mixed", "raw"]:
-                for s in servers_data["servers"].get(t, []):
-                    if s["name"].lower() == server.lower():
-                        target_server = s
-                        type = t
-                        break
-                if target_server:
+        # First get the servers fragment
+        data = await self._fetch_servers_html(episode_id)
+        if data.get("error"):
+            return {"error": data["error"]}
+        
+        # Fast path: regex the requested server straight out of the fragment
+        target_id = _find_server_id(data["html"], server, type)
+        
+        if not target_id:
+            # Parse the fragment, trying the requested type and then any other type
+            index: Dict[Tuple[str, str], Dict[str, str]] = {}
+            all_servers = self._parse_servers(_parse(data["html"]), index=index)
+            wanted = server.lower()
+            for t in (type, *_FALLBACK_TYPE_ORDER):
+                match = index.get((wanted, t))
+                if match:
+                    target_id = match["id"]
+                    type = t
                     break
-        
-        if not target_server:
-            return {
-                "error": f"Server '{server}' not found for type '{type}'",
-                "available_servers": servers_data["servers"],
-            }
+            
+            if not target_id:
+                return {
+                    "error": f"Server '{server}' not found for type '{type}'",
+                    "available_servers": all_servers,
+                }
         
         # Get the source link
         referer = f"{self.base_url}/watch?ep={episode_id}"
-        source_link = await self._get_server_source_link(target_server["id"], referer)
+        source_link = await self._get_server_source_link(target_id, referer)
         
         if not source_link:
             return {"error": "Failed to get source link"}
@@ -503,10 +764,52 @@ class HiAnime:
             **video_data,
         }
     
+    async def get_streams(self, anime_id: str, episode_nums: List[int], type: str = "sub", server: str = "HD-1") -> Dict[str, Any]:
+        """
+        Get streams for several episodes of one anime at once.
+        Fetches the episode list once, then resolves every episode's video concurrently.
+        Upstream requests still go through the shared concurrency limit.
+        """
+        episodes_data = await self.get_episodes(anime_id)
+        if episodes_data.get("error"):
+            return {"error": episodes_data["error"]}
+        
+        # First episode per whole number, matching get_stream
+        by_number: Dict[int, Dict[str, Any]] = {}
+        for ep in episodes_data["episodes"]:
+            by_number.setdefault(int(ep["number"]), ep)
+        
+        wanted = list(dict.fromkeys(episode_nums))
+        found = [(num, by_number[num]) for num in wanted if num in by_number]
+        
+        results = await asyncio.gather(
+            *[self.get_video(ep["id"], server, type) for _, ep in found],
+            return_exceptions=True,
+        )
+        
+        streams = []
+        for (num, ep), video_data in zip(found, results):
+            if isinstance(video_data, Exception):
+                video_data = {"error": f"Failed to get video: {video_data}"}
+            streams.append({
+                "episode": num,
+                "episode_title": ep["title"],
+                **video_data,
+            })
+        
+        return {
+            "anime_id": anime_id,
+            "server": server,
+            "type": type,
+            "streams": streams,
+            "missing_episodes": [num for num in wanted if num not in by_number],
+            "total_episodes": episodes_data["total_episodes"],
+        }
+    
     async def close(self):
-        """Close the aiohttp session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Close the HTTP client"""
+        if self._client and not self._client.is_closed:
+            await self._client.aclose()
         # Also close extractor sessions
         await self.megacloud_extractor.close()
         await self.streamtape_extractor.close()
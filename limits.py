@@ -0,0 +1,123 @@
+"""
+Limits on outbound requests to upstream sites
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests are in flight at once.
+    Works like asyncio.Semaphore, but the limit can be changed at runtime.
+    """
+    
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self._limit = limit
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+    
+    @property
+    def limit(self) -> int:
+        return self._limit
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    def set_limit(self, limit: int) -> None:
+        """Resize the limit; requests already in flight keep their slots"""
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self._limit = limit
+        self._wake()
+    
+    async def acquire(self) -> None:
+        if not self._waiters and self._active < self._limit:
+            self._active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            else:
+                # Cancelled after a slot was handed over; pass it on
+                self.release()
+            raise
+    
+    def release(self) -> None:
+        """Free a slot and hand it to the next waiter; never blocks"""
+        self._active -= 1
+        self._wake()
+    
+    def _wake(self) -> None:
+        # Slots are counted as taken when handed over, so a new caller can't
+        # grab one between a waiter being woken and it running
+        while self._waiters and self._active < self._limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._active += 1
+    
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class RateLimiter:
+    """
+    Token bucket: allows `rate` acquisitions per second on average, with
+    bursts of up to `burst`. Waiters are served in arrival order.
+    """
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class HostRateLimiter:
+    """A RateLimiter per host, with `default_rate` for hosts not listed in `rates`"""
+    
+    def __init__(self, default_rate: float, rates: Optional[Dict[str, float]] = None):
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self._limiters: Dict[str, RateLimiter] = {}
+    
+    def for_host(self, host: str) -> RateLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = RateLimiter(self.rates.get(host, self.default_rate))
+            self._limiters[host] = limiter
+        return limiter
+    
+    async def acquire(self, host: str) -> None:
+        await self.for_host(host).acquire()
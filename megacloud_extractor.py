@@ -3,11 +3,110 @@ MegaCloud Extractor - Python port from Kotlin
 Handles video extraction from MegaCloud/RapidCloud servers (HD-1, HD-2, HD-3)
 """
 
-import aiohttp
+import asyncio
+import httpx
+import orjson
 import re
-import json
-from typing import Optional, List, Dict, Any
-from urllib.parse import urlencode, quote
+from itertools import islice
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from ttl_cache import TTLCache
+from limits import ConcurrencyLimiter
+from extractor_session import get_client, close_client
+
+
+# Response bodies are matched as raw bytes; only the captured parts are decoded
+
+# Nonce embedded in the player page: one 48-char token, or three 16-char ones
+_NONCE48 = re.compile(rb'\b[a-zA-Z0-9]{48}\b')
+_TOKEN16 = re.compile(rb'\b[a-zA-Z0-9]{16}\b')
+
+_FILE_RE = re.compile(rb'"file":"(.*?)"')
+_RES_RE = re.compile(rb'RESOLUTION=(\d+x\d+)')
+
+# A variant in a master playlist: its attributes and the URI on the next line,
+# captured without surrounding whitespace or the CR of a CRLF line ending
+_STREAM_ENTRY = re.compile(
+    rb'^#EXT-X-STREAM-INF([^\r\n]*)\r?\n[ \t]*([^#\s][^\r\n]*?)[ \t]*\r?$',
+    re.MULTILINE,
+)
+
+_HOST_RE = re.compile(r'https?://([^/?#]+)', re.IGNORECASE)
+
+# MegaCloud names variant (media) playlists index-f1-v1-a1.m3u8 and the like
+_VARIANT_URL = re.compile(r'/index-[^/?#]*\.m3u8(?:[?#]|$)')
+
+# Tags only found in media playlists, which list segments rather than variants
+_MEDIA_TAGS = (b"#EXTINF", b"#EXT-X-TARGETDURATION")
+
+# Headers shared by every request of a kind; a Referer is added per host
+_XHR_HEADERS = MappingProxyType({
+    "Accept": "*/*",
+    "X-Requested-With": "XMLHttpRequest",
+})
+_JSON_HEADERS = MappingProxyType({"Content-Type": "application/json"})
+
+
+def _find_nonce(page: bytes) -> Optional[str]:
+    """Find the player nonce: a 48-char token, else the first three 16-char tokens joined"""
+    match = _NONCE48.search(page)
+    if match:
+        return match.group(0).decode("ascii")
+    # A single left-to-right pass; no lazy .*? gaps to backtrack over
+    tokens = [m.group(0) for m in islice(_TOKEN16.finditer(page), 3)]
+    return b"".join(tokens).decode("ascii") if len(tokens) == 3 else None
+
+
+async def _read_nonce(chunks: AsyncIterator[bytes]) -> Optional[str]:
+    """
+    Find the nonce while the player page downloads, stopping at the first 48-char token.
+    The whole page is only searched for the 3x16 form once the stream runs out.
+    """
+    buf = bytearray()
+    async for chunk in chunks:
+        # Rescan the tail of the previous chunks so a token split across them is found
+        start = max(0, len(buf) - 49)
+        buf += chunk
+        match = _NONCE48.search(buf, start)
+        # A token touching the end of the buffer may continue in the next chunk
+        if match and match.end() < len(buf):
+            return match.group(0).decode("ascii")
+    return _find_nonce(buf)
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    """Retrieve a background task's outcome so an unused failure isn't logged"""
+    if not task.cancelled():
+        task.exception()
+
+
+def _decrypted_file(body: bytes) -> Optional[str]:
+    """Pick the playlist URL out of a decrypt API reply; None when it has none"""
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("file"), str):
+        return data["file"]
+    
+    # Otherwise pick the file URL out of wherever the reply nests it
+    file_match = _FILE_RE.search(body)
+    return file_match.group(1).decode("utf-8") if file_match else None
+
+
+def _parse_master(playlist: bytes, base_url: str) -> List[Dict[str, str]]:
+    """List the variants of an HLS master playlist in one pass over its body"""
+    qualities = []
+    for entry in _STREAM_ENTRY.finditer(playlist):
+        res_match = _RES_RE.search(entry.group(1))
+        url = entry.group(2).decode("utf-8", "replace")
+        qualities.append({
+            "resolution": res_match.group(1).decode("ascii") if res_match else "Unknown",
+            # Handle relative URLs
+            "url": url if url.startswith("http") else f"{base_url}/{url}",
+        })
+    return qualities
 
 
 class MegaCloudExtractor:
@@ -22,20 +121,44 @@ class MegaCloudExtractor:
     # API for decryption (you need to host this or use the external one)
     MEGACLOUD_API = "https://megacloud-api.vercel.app/api/decrypt"
     
+    # Max decrypt API calls in flight at once, so bursts don't hammer it
+    DECRYPT_CONCURRENCY = 8
+    
+    KEYS_URL = "https://raw.githubusercontent.com/yogesh-hacker/MegacloudKeys/refs/heads/main/keys.json"
+    
+    # The key rotates rarely, so it is fetched at most once per KEY_TTL seconds
+    KEY_TTL = 300
+    _key_cache = TTLCache(KEY_TTL, maxsize=1)
+    
+    # Extracted videos are reused for this long (seconds), so repeat and
+    # concurrent requests for one embed URL share a single extraction
+    EXTRACT_CACHE_TTL = 60
+    EXTRACT_CACHE_SIZE = 256
+    _extract_cache = TTLCache(EXTRACT_CACHE_TTL, EXTRACT_CACHE_SIZE)
+    
+    # Master playlists don't change while their stream token is valid
+    PLAYLIST_CACHE_TTL = 120
+    PLAYLIST_CACHE_SIZE = 512
+    _playlist_cache = TTLCache(PLAYLIST_CACHE_TTL, PLAYLIST_CACHE_SIZE)
+    
     def __init__(self, megacloud_api: str = None):
         self.megacloud_api = megacloud_api or self.MEGACLOUD_API
-        self._session: Optional[aiohttp.ClientSession] = None
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
+        self._decrypt_limiter = ConcurrencyLimiter(self.DECRYPT_CONCURRENCY)
+        # Ciphertext is POSTed as JSON; cleared once a POST gets no file URL
+        # but the same payload as a query-string GET does
+        self._decrypt_post = True
     
     async def extract(self, url: str, type: str, name: str) -> List[Dict[str, Any]]:
         """
         Extract video URLs from MegaCloud embed URL.
         Mirrors getVideosFromUrl from Kotlin.
         """
+        # Failed extractions come back empty and aren't cached
+        return await self._extract_cache.get_or_load(
+            f"{name}:{type}:{url}", lambda: self._extract(url, type, name), keep=bool
+        )
+    
+    async def _extract(self, url: str, type: str, name: str) -> List[Dict[str, Any]]:
         try:
             video_data = await self._get_video_dto(url)
             
@@ -43,27 +166,23 @@ class MegaCloudExtractor:
                 return []
             
             videos = []
+            referer = f"https://{self._get_host(url)}/"
             
-            for video in video_data:
-                m3u8_url = video.get("m3u8", "")
-                tracks = video.get("tracks", [])
-                
-                # Filter subtitle tracks
-                subtitles = [
-                    {"url": t["file"], "label": t.get("label", "Unknown")}
-                    for t in tracks
-                    if t.get("kind") == "captions"
-                ]
-                
-                # Extract quality variants from HLS playlist
-                qualities = await self._extract_qualities(m3u8_url, url)
+            # Fetch every source's master playlist at once
+            quality_lists = await asyncio.gather(*[
+                self._extract_qualities(video["m3u8"], url) for video in video_data
+            ])
+            
+            for video, qualities in zip(video_data, quality_lists):
+                m3u8_url = video["m3u8"]
+                subtitles = video["subtitles"]
                 
                 for quality in qualities:
                     videos.append({
                         "quality": f"{name} - {quality['resolution']} - {type}",
                         "url": quality["url"],
                         "subtitles": subtitles,
-                        "referer": f"https://{self._get_host(url)}/",
+                        "referer": referer,
                     })
                 
                 # If no specific qualities found, add the main m3u8
@@ -72,7 +191,7 @@ class MegaCloudExtractor:
                         "quality": f"{name} - Auto - {type}",
                         "url": m3u8_url,
                         "subtitles": subtitles,
-                        "referer": f"https://{self._get_host(url)}/",
+                        "referer": referer,
                     })
             
             return videos
@@ -102,31 +221,18 @@ class MegaCloudExtractor:
         
         megacloud_server_url = f"https://{host}"
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-            "X-Requested-With": "XMLHttpRequest",
-            "Referer": f"{megacloud_server_url}/",
-        }
-        
-        session = await self._get_session()
+        headers = {**_XHR_HEADERS, "Referer": f"{megacloud_server_url}/"}
         
-        # Fetch the embed page to get the nonce
-        async with session.get(url, headers=headers) as response:
-            response_text = await response.text()
+        client = await get_client()
         
-        # Extract nonce - try 48-char match first, then 3x16-char match
-        nonce = None
+        # The key lives on another host, so fetch it while the embed page loads.
+        # It is left to finish even when no source needs it, which warms the cache.
+        key_task = asyncio.create_task(self._request_new_key())
+        key_task.add_done_callback(_consume_result)
         
-        # Try 48-character nonce
-        match1 = re.search(r'\b[a-zA-Z0-9]{48}\b', response_text)
-        if match1:
-            nonce = match1.group(0)
-        else:
-            # Try 3x16-character nonce
-            match2 = re.search(r'\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b', response_text, re.DOTALL)
-            if match2:
-                nonce = match2.group(1) + match2.group(2) + match2.group(3)
+        # Fetch the embed page to get the nonce
+        async with client.stream("GET", url, headers=headers) as response:
+            nonce = await _read_nonce(response.aiter_bytes(8192))
         
         if not nonce:
             raise Exception("Failed to extract nonce from response")
@@ -134,82 +240,89 @@ class MegaCloudExtractor:
         # Fetch sources with nonce
         sources_url = f"{megacloud_server_url}{self.SOURCES_URL}{video_id}&_k={nonce}"
         
-        async with session.get(sources_url, headers=headers) as response:
-            src_res = await response.text()
+        response = await client.get(sources_url, headers=headers)
         
         try:
-            data = json.loads(src_res)
-        except json.JSONDecodeError:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
             raise Exception("Failed to parse sources response")
         
         sources = data.get("sources", [])
         encrypted = data.get("encrypted", True)
-        tracks = data.get("tracks", [])
         
-        # Get decryption key if needed
-        key = None
+        # Every source shares one track list, so filter the subtitles once
+        subtitles = [
+            {"url": t["file"], "label": t.get("label", "Unknown")}
+            for t in data.get("tracks", [])
+            if t.get("kind") == "captions"
+        ]
         
-        result = []
+        # Decrypt every source at once; a source that fails is dropped
+        results = await asyncio.gather(*[
+            self._decrypt_one(client, source.get("file", ""), encrypted, nonce, key_task)
+            for source in sources
+        ], return_exceptions=True)
         
-        for source in sources:
-            encoded = source.get("file", "")
-            
-            if not encrypted or ".m3u8" in encoded:
-                m3u8 = encoded
-            else:
-                # Decrypt using API
-                if key is None:
-                    key = await self._request_new_key()
-                
-                decrypt_url = (
-                    f"{self.megacloud_api}"
-                    f"?encrypted_data={quote(encoded)}"
-                    f"&nonce={quote(nonce)}"
-                    f"&secret={quote(key)}"
+        m3u8s = [r for r in results if not isinstance(r, BaseException)]
+        if not m3u8s and results:
+            raise results[0]
+        
+        return [{"m3u8": m3u8, "subtitles": subtitles} for m3u8 in m3u8s]
+    
+    async def _decrypt_one(self, client: httpx.AsyncClient, encoded: str, encrypted: bool,
+                           nonce: str, key_task: "asyncio.Task[str]") -> str:
+        """Return the playlist URL of one source, decrypting it if needed"""
+        if not encrypted or ".m3u8" in encoded:
+            return encoded
+        
+        # Decrypt using API
+        payload = {"encrypted_data": encoded, "nonce": nonce, "secret": await key_task}
+        
+        async with self._decrypt_limiter:
+            if self._decrypt_post:
+                response = await client.post(
+                    self.megacloud_api,
+                    content=orjson.dumps(payload),
+                    headers=_JSON_HEADERS,
                 )
-                
-                async with session.get(decrypt_url) as response:
-                    decrypted_response = await response.text()
-                
-                # Extract file URL from response
-                file_match = re.search(r'"file":"(.*?)"', decrypted_response)
-                if file_match:
-                    m3u8 = file_match.group(1)
-                else:
-                    raise Exception("Video URL not found in decrypted response")
+                file_url = _decrypted_file(response.content)
+                if file_url:
+                    return file_url
             
-            result.append({
-                "m3u8": m3u8,
-                "tracks": tracks,
-            })
-        
-        return result
+            # APIs that only read the query string reject a JSON body with an
+            # error status or an error body, so retry the payload as a GET
+            response = await client.get(self.megacloud_api, params=payload)
+            file_url = _decrypted_file(response.content)
+            if not file_url:
+                raise Exception("Video URL not found in decrypted response")
+            self._decrypt_post = False
+            return file_url
     
     async def _request_new_key(self) -> str:
         """
         Fetch the current MegaCloud decryption key.
         Mirrors requestNewKey from Kotlin.
         """
-        session = await self._get_session()
+        return await self._key_cache.get_or_load("mega", self._fetch_key)
+    
+    async def _fetch_key(self) -> str:
+        client = await get_client()
         
-        keys_url = "https://raw.githubusercontent.com/yogesh-hacker/MegacloudKeys/refs/heads/main/keys.json"
+        response = await client.get(self.KEYS_URL)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch keys.json")
         
-        async with session.get(keys_url) as response:
-            if response.status != 200:
-                raise Exception("Failed to fetch keys.json")
-            
-            keys_json = await response.text()
-            
-            if not keys_json:
-                raise Exception("keys.json is empty")
-            
-            keys = json.loads(keys_json)
-            key = keys.get("mega")
-            
-            if not key:
-                raise Exception("Mega key not found in keys.json")
-            
-            return key
+        if not response.content:
+            raise Exception("keys.json is empty")
+        
+        keys = orjson.loads(response.content)
+        
+        key = keys.get("mega")
+        
+        if not key:
+            raise Exception("Mega key not found in keys.json")
+        
+        return key
     
     async def _extract_qualities(self, m3u8_url: str, referer_url: str) -> List[Dict[str, str]]:
         """
@@ -218,59 +331,38 @@ class MegaCloudExtractor:
         if not m3u8_url:
             return []
         
-        session = await self._get_session()
-        host = self._get_host(referer_url)
-        
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Referer": f"https://{host}/",
-        }
-        
         try:
-            async with session.get(m3u8_url, headers=headers) as response:
-                playlist = await response.text()
-            
-            qualities = []
-            base_url = m3u8_url.rsplit("/", 1)[0]
-            
-            lines = playlist.strip().split("\n")
-            for i, line in enumerate(lines):
-                if line.startswith("#EXT-X-STREAM-INF"):
-                    # Extract resolution
-                    res_match = re.search(r'RESOLUTION=(\d+x\d+)', line)
-                    resolution = res_match.group(1) if res_match else "Unknown"
-                    
-                    # Get the URL on the next line
-                    if i + 1 < len(lines):
-                        url_line = lines[i + 1].strip()
-                        if url_line and not url_line.startswith("#"):
-                            # Handle relative URLs
-                            if url_line.startswith("http"):
-                                quality_url = url_line
-                            else:
-                                quality_url = f"{base_url}/{url_line}"
-                            
-                            qualities.append({
-                                "resolution": resolution,
-                                "url": quality_url,
-                            })
-            
-            return qualities
+            return await self._playlist_cache.get_or_load(
+                m3u8_url, lambda: self._fetch_qualities(m3u8_url, referer_url), keep=bool
+            )
             
         except Exception as e:
             print(f"Error extracting qualities: {e}")
             return []
     
+    async def _fetch_qualities(self, m3u8_url: str, referer_url: str) -> List[Dict[str, str]]:
+        # A variant playlist has no qualities to list; callers fall back to Auto
+        if _VARIANT_URL.search(m3u8_url):
+            return []
+        
+        client = await get_client()
+        host = self._get_host(referer_url)
+        
+        body = bytearray()
+        async with client.stream("GET", m3u8_url, headers={"Referer": f"https://{host}/"}) as response:
+            async for chunk in response.aiter_bytes(4096):
+                # Media playlists can run to thousands of segments; stop at the header
+                if not body and any(tag in chunk for tag in _MEDIA_TAGS):
+                    return []
+                body += chunk
+        
+        return _parse_master(body, m3u8_url.rsplit("/", 1)[0])
+    
     def _get_host(self, url: str) -> Optional[str]:
         """Extract host from URL"""
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            return parsed.netloc
-        except:
-            return None
+        match = _HOST_RE.match(url)
+        return match.group(1) if match else None
     
     async def close(self):
-        """Close the aiohttp session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Close the shared HTTP client"""
+        await close_client()
@@ -3,10 +3,17 @@ StreamTape Extractor - Python port from Kotlin
 Handles video extraction from StreamTape servers
 """
 
-import aiohttp
 import re
 from typing import Optional, Dict, Any, List
-from bs4 import BeautifulSoup
+
+from extractor_session import get_client, close_client
+
+
+# document.getElementById('robotlink').innerHTML = '<part1>' + ('xcd<part2>')
+_ROBOTLINK = re.compile(
+    r"document\.getElementById\('robotlink'\)\.innerHTML\s*=\s*'([^']+)'"
+    r"(?:\s*\+\s*\('xcd([^']+)'\))?"
+)
 
 
 class StreamTapeExtractor:
@@ -17,14 +24,6 @@ class StreamTapeExtractor:
     
     BASE_URL = "https://streamtape.com/e/"
     
-    def __init__(self):
-        self._session: Optional[aiohttp.ClientSession] = None
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
-    
     async def extract(self, url: str, quality: str = "Streamtape", subtitles: List[Dict] = None) -> Optional[Dict[str, Any]]:
         """
         Extract video URL from StreamTape.
@@ -44,41 +43,18 @@ class StreamTapeExtractor:
             else:
                 new_url = url
             
-            session = await self._get_session()
-            
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            }
-            
-            async with session.get(new_url, headers=headers) as response:
-                html = await response.text()
-            
-            soup = BeautifulSoup(html, "html.parser")
-            
-            # Find script containing robotlink
-            target_line = "document.getElementById('robotlink')"
-            script_elem = None
-            
-            for script in soup.select("script"):
-                if script.string and target_line in script.string:
-                    script_elem = script
-                    break
-            
-            if not script_elem or not script_elem.string:
-                return None
-            
-            script_data = script_elem.string
+            client = await get_client()
             
-            # Extract video URL parts
-            # Pattern: document.getElementById('robotlink').innerHTML = '<part1>' + ('xcd<part2>')
-            part1_match = re.search(r"innerHTML\s*=\s*'([^']+)'", script_data)
-            part2_match = re.search(r"\+\s*\('xcd([^']+)'\)", script_data)
+            response = await client.get(new_url)
+            html = response.text
             
-            if not part1_match:
+            # Extract video URL parts straight from the page, without building a tree
+            match = _ROBOTLINK.search(html)
+            if not match:
                 return None
             
-            part1 = part1_match.group(1)
-            part2 = part2_match.group(1) if part2_match else ""
+            part1 = match.group(1)
+            part2 = match.group(2) or ""
             
             video_url = f"https:{part1}{part2}"
             
@@ -101,6 +77,5 @@ class StreamTapeExtractor:
         return [video] if video else []
     
     async def close(self):
-        """Close the aiohttp session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Close the shared HTTP client"""
+        await close_client()
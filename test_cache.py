@@ -0,0 +1,243 @@
+"""
+Test response caching for HiAnime API
+"""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+import cache
+from app import app
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class FakeRedis:
+    """In-memory stand-in for the few redis.asyncio calls the cache uses"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, key, mapping):
+        self.ops.append((key, mapping))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        for key, mapping in self.ops:
+            self.redis.hashes[key] = {
+                k.encode(): v if isinstance(v, bytes) else str(v).encode()
+                for k, v in mapping.items()
+            }
+
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def mock_hianime():
+    """Mock the hianime instance for all tests"""
+    with patch('app.hianime') as mock:
+        yield mock
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """Enable caching against an in-memory Redis"""
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "_redis", fake)
+    return fake
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Enable caching against the in-memory backend"""
+    store = TTLCache(ttl=3600, maxsize=2)
+    monkeypatch.setattr(cache, "_memory", store)
+    return store
+
+
+class TestResponseCache:
+    """Test suite for the Redis response cache"""
+
+    def test_disabled_without_redis(self, client, mock_hianime):
+        """Test every request reaches the scraper when no cache backend is connected"""
+        mock_hianime.get_popular = AsyncMock(return_value={"results": [{"id": "a"}]})
+
+        client.get("/popular?page=1")
+        client.get("/popular?page=1")
+
+        assert mock_hianime.get_popular.await_count == 2
+
+    def test_hit_skips_handler(self, client, mock_hianime, redis):
+        """Test a fresh cached response is served without calling the scraper"""
+        mock_hianime.get_popular = AsyncMock(return_value={"results": [{"id": "a"}]})
+
+        first = client.get("/popular?page=1")
+        second = client.get("/popular?page=1")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == {"results": [{"id": "a"}]}
+        assert mock_hianime.get_popular.await_count == 1
+
+    def test_key_includes_params(self, client, mock_hianime, redis):
+        """Test different query parameters are cached separately"""
+        mock_hianime.get_popular = AsyncMock(return_value={"results": [{"id": "a"}]})
+
+        client.get("/popular?page=1")
+        response = client.get("/popular?page=2")
+
+        assert response.headers["X-Cache"] == "MISS"
+        assert mock_hianime.get_popular.await_count == 2
+
+    def test_errors_not_cached(self, client, mock_hianime, redis):
+        """Test error responses are not stored"""
+        mock_hianime.get_anime_details = AsyncMock(return_value={"error": "Anime not found"})
+
+        client.get("/info/missing-1")
+        response = client.get("/info/missing-1")
+
+        assert response.status_code == 404
+        assert redis.hashes == {}
+
+    def test_stale_served_when_upstream_down(self, client, mock_hianime, redis, monkeypatch):
+        """Test an expired entry is served when the scraper reports a 503"""
+        mock_hianime.get_latest = AsyncMock(return_value={"results": [{"id": "a"}]})
+        client.get("/latest?page=1")
+
+        monkeypatch.setattr(cache.time, "time", lambda: 10 ** 12)
+        mock_hianime.get_latest = AsyncMock(return_value={"error": "Connection timeout"})
+        response = client.get("/latest?page=1")
+
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "STALE"
+        assert response.json() == {"results": [{"id": "a"}]}
+
+    def test_episodes_keyed_on_numeric_id(self, client, mock_hianime, redis):
+        """Test episode lists are shared between slugs with the same numeric ID"""
+        mock_hianime.get_episodes = AsyncMock(return_value={"anime_id": "boruto-8143", "episodes": [{"id": "1"}]})
+
+        client.get("/episodes/boruto-8143")
+        response = client.get("/episodes/boruto-naruto-next-generations-8143")
+
+        assert response.json() == {"anime_id": "boruto-naruto-next-generations-8143", "episodes": [{"id": "1"}]}
+        assert mock_hianime.get_episodes.await_count == 1
+        assert list(redis.hashes) == ["eps:8143"]
+
+    def test_episodes_refresh_bypasses_cache(self, client, mock_hianime, redis):
+        """Test ?refresh=1 reloads the episode list and updates the cache"""
+        mock_hianime.get_episodes = AsyncMock(return_value={"episodes": [{"id": "1"}]})
+        client.get("/episodes/boruto-8143")
+
+        mock_hianime.get_episodes = AsyncMock(return_value={"episodes": [{"id": "1"}, {"id": "2"}]})
+        refreshed = client.get("/episodes/boruto-8143?refresh=1")
+        cached = client.get("/episodes/boruto-8143")
+
+        assert len(refreshed.json()["episodes"]) == 2
+        assert len(cached.json()["episodes"]) == 2
+        assert mock_hianime.get_episodes.await_count == 1
+
+    def test_episodes_errors_not_cached(self, client, mock_hianime, redis):
+        """Test failed episode lookups are not stored"""
+        mock_hianime.get_episodes = AsyncMock(return_value={"error": "Anime not found"})
+
+        response = client.get("/episodes/missing-1")
+
+        assert response.status_code == 404
+        assert redis.hashes == {}
+
+
+class TestMemoryCache:
+    """Test suite for the in-memory response cache used without Redis"""
+
+    def test_connect_without_url_uses_memory(self, monkeypatch):
+        """Test connecting without a Redis URL enables the memory backend"""
+        monkeypatch.setattr(cache, "_memory", None)
+        asyncio.run(cache.connect(None))
+
+        assert cache._redis is None
+        assert isinstance(cache._memory, TTLCache)
+
+        asyncio.run(cache.close())
+        assert cache._memory is None
+
+    def test_hit_skips_handler(self, client, mock_hianime, memory):
+        """Test a fresh response is served from memory without calling the scraper"""
+        mock_hianime.get_popular = AsyncMock(return_value={"results": [{"id": "a"}]})
+
+        first = client.get("/popular?page=1")
+        second = client.get("/popular?page=1")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == {"results": [{"id": "a"}]}
+        assert mock_hianime.get_popular.await_count == 1
+
+    def test_stale_served_when_upstream_down(self, client, mock_hianime, memory, monkeypatch):
+        """Test an expired in-memory entry is served when the scraper reports a 503"""
+        mock_hianime.get_latest = AsyncMock(return_value={"results": [{"id": "a"}]})
+        client.get("/latest?page=1")
+
+        monkeypatch.setattr(cache.time, "time", lambda: 10 ** 12)
+        mock_hianime.get_latest = AsyncMock(return_value={"error": "Connection timeout"})
+        response = client.get("/latest?page=1")
+
+        assert response.headers["X-Cache"] == "STALE"
+        assert response.json() == {"results": [{"id": "a"}]}
+
+    def test_entries_expire_after_stale_grace(self, client, mock_hianime, memory, monkeypatch):
+        """Test in-memory entries are dropped STALE_GRACE after going stale, like Redis keys"""
+        mock_hianime.get_latest = AsyncMock(return_value={"results": [{"id": "a"}]})
+        client.get("/latest?page=1")
+        (key,) = memory._data
+        expires_in = cache.CACHE_POLICIES["short"] + cache.STALE_GRACE
+        monotonic = ttl_cache.time.monotonic
+
+        monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: monotonic() + expires_in - 10)
+        assert memory.get(key) is not None
+        monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: monotonic() + expires_in + 10)
+        assert memory.get(key) is None
+
+    def test_episodes_cached(self, client, mock_hianime, memory):
+        """Test episode lists are remembered in memory"""
+        mock_hianime.get_episodes = AsyncMock(return_value={"episodes": [{"id": "1"}]})
+
+        client.get("/episodes/boruto-8143")
+        client.get("/episodes/boruto-8143")
+
+        assert mock_hianime.get_episodes.await_count == 1
+
+    def test_bounded_by_maxsize(self, client, mock_hianime, memory):
+        """Test the least recently used response is dropped past maxsize"""
+        mock_hianime.get_popular = AsyncMock(return_value={"results": [{"id": "a"}]})
+
+        for page in (1, 2, 3, 1):
+            client.get(f"/popular?page={page}")
+
+        assert mock_hianime.get_popular.await_count == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,586 @@
+"""
+Test the MegaCloud and StreamTape extractors
+"""
+import asyncio
+import time
+import httpx
+import orjson
+import pytest
+from unittest.mock import AsyncMock
+import megacloud_extractor
+import streamtape_extractor
+from streamtape_extractor import StreamTapeExtractor
+from megacloud_extractor import MegaCloudExtractor, _find_nonce, _read_nonce, _parse_master
+
+
+NONCE48 = "a1B2c3D4e5F6g7H8i9J0k1L2m3N4o5P6q7R8s9T0u1V2w3X4"
+
+
+class TestFindNonce:
+    """Test suite for the player nonce lookup"""
+
+    def test_48_char_nonce(self):
+        """Test a 48-char token is returned as is"""
+        html = f'<script>window._k = "{NONCE48}";</script>'.encode()
+        assert _find_nonce(html) == NONCE48
+
+    def test_three_16_char_tokens(self):
+        """Test the first three 16-char tokens are joined when there's no 48-char one"""
+        html = (
+            b'<div data-a="AAAAAAAAAAAAAAA1"></div>'
+            b'<div data-b="BBBBBBBBBBBBBBB2"></div>\n'
+            b'<div data-c="CCCCCCCCCCCCCCC3"></div>'
+            b'<div data-d="DDDDDDDDDDDDDDD4"></div>'
+        )
+        assert _find_nonce(html) == "AAAAAAAAAAAAAAA1BBBBBBBBBBBBBBB2CCCCCCCCCCCCCCC3"
+
+    def test_longer_tokens_ignored(self):
+        """Test tokens that merely contain 16 alphanumerics don't count"""
+        html = b"AAAAAAAAAAAAAAAAA BBBBBBBBBBBBBBB2 CCCCCCCCCCCCCCC3"
+        assert _find_nonce(html) is None
+
+    def test_no_nonce(self):
+        """Test None is returned when fewer than three tokens exist"""
+        assert _find_nonce(b"<html><body>nothing here</body></html>") is None
+
+    def test_linear_on_partial_matches(self):
+        """Test a large page with only two tokens is scanned quickly"""
+        html = b"AAAAAAAAAAAAAAA1 " + b"x " * 200000 + b"BBBBBBBBBBBBBBB2"
+        start = time.perf_counter()
+        assert _find_nonce(html) is None
+        assert time.perf_counter() - start < 1
+
+
+class TestReadNonce:
+    """Test suite for finding the nonce while the page streams in"""
+
+    @staticmethod
+    def read(*chunks):
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+        return asyncio.run(_read_nonce(stream()))
+
+    def test_stops_at_first_match(self):
+        """Test the stream isn't read past the chunk holding the nonce"""
+        consumed = []
+
+        async def stream():
+            for chunk in (b"<html>", f'"{NONCE48}";'.encode(), b"rest", b"more"):
+                consumed.append(chunk)
+                yield chunk
+
+        assert asyncio.run(_read_nonce(stream())) == NONCE48
+        assert len(consumed) == 2
+
+    def test_nonce_split_across_chunks(self):
+        """Test a nonce cut in two by a chunk boundary is still found"""
+        page = f'<script>k="{NONCE48}"</script>'.encode()
+        for cut in range(10, 60):
+            assert self.read(page[:cut], page[cut:]) == NONCE48
+
+    def test_longer_token_not_cut_short(self):
+        """Test a long token ending a chunk isn't mistaken for the nonce"""
+        assert self.read(b"x " + b"A" * 48, b"BBBB " + NONCE48.encode() + b" ") == NONCE48
+
+    def test_falls_back_to_16_char_tokens(self):
+        """Test the 3x16 form is used once the stream ends without a 48-char token"""
+        assert self.read(
+            b"AAAAAAAAAAAAAAA1 BBBBBB", b"BBBBBBBBB2 ", b"CCCCCCCCCCCCCCC3"
+        ) == "AAAAAAAAAAAAAAA1BBBBBBBBBBBBBBB2CCCCCCCCCCCCCCC3"
+
+
+class TestGetHost:
+    """Test suite for reading the host out of a URL"""
+
+    def test_hosts(self):
+        """Test the host is taken up to the first path, query or fragment"""
+        extractor = MegaCloudExtractor()
+        assert extractor._get_host(EMBED_URL) == "megacloud.blog"
+        assert extractor._get_host("https://cdn.example:8443?x=1") == "cdn.example:8443"
+        assert extractor._get_host("HTTP://Cdn.Example#top") == "Cdn.Example"
+
+    def test_not_a_url(self):
+        """Test strings without a scheme have no host"""
+        assert MegaCloudExtractor()._get_host("megacloud.blog/embed") is None
+        assert MegaCloudExtractor()._get_host("") is None
+
+
+class TestParseMaster:
+    """Test suite for reading variants out of an HLS master playlist"""
+
+    PLAYLIST = (
+        b"#EXTM3U\n"
+        b"#EXT-X-VERSION:3\n"
+        b"#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\n"
+        b"index-f1-v1-a1.m3u8\n"
+        b"#EXT-X-STREAM-INF:BANDWIDTH=2800000,RESOLUTION=1920x1080\n"
+        b"https://cdn.example/1080/index.m3u8\n"
+    )
+
+    def test_variants(self):
+        """Test resolutions are read and relative URIs resolved"""
+        assert _parse_master(self.PLAYLIST, "https://cdn.example/hls") == [
+            {"resolution": "640x360", "url": "https://cdn.example/hls/index-f1-v1-a1.m3u8"},
+            {"resolution": "1920x1080", "url": "https://cdn.example/1080/index.m3u8"},
+        ]
+
+    def test_crlf_line_endings(self):
+        """Test playlists served with CRLF give the same variants"""
+        crlf = self.PLAYLIST.replace(b"\n", b"\r\n")
+        assert _parse_master(crlf, "https://cdn.example/hls") == _parse_master(self.PLAYLIST, "https://cdn.example/hls")
+
+    def test_uri_whitespace_trimmed(self):
+        """Test padding around a URI and a final line without a newline are handled"""
+        playlist = b"#EXTM3U\r\n#EXT-X-STREAM-INF:RESOLUTION=640x360\r\n  low.m3u8 \t\r\n#EXT-X-STREAM-INF:RESOLUTION=1280x720\nhigh.m3u8"
+        assert [q["url"] for q in _parse_master(playlist, "https://cdn.example")] == [
+            "https://cdn.example/low.m3u8",
+            "https://cdn.example/high.m3u8",
+        ]
+
+    def test_missing_resolution(self):
+        """Test a variant without RESOLUTION is kept as Unknown"""
+        playlist = b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow.m3u8\n"
+        assert _parse_master(playlist, "https://cdn.example") == [
+            {"resolution": "Unknown", "url": "https://cdn.example/low.m3u8"},
+        ]
+
+    def test_variant_without_uri_skipped(self):
+        """Test a STREAM-INF tag not followed by a URI is ignored"""
+        playlist = b"#EXT-X-STREAM-INF:RESOLUTION=640x360\n\n#EXT-X-ENDLIST\n"
+        assert _parse_master(playlist, "https://cdn.example") == []
+
+    def test_media_playlist(self):
+        """Test a media playlist has no variants"""
+        playlist = b"#EXTM3U\n#EXT-X-TARGETDURATION:10\n#EXTINF:10,\nseg-1.ts\n#EXT-X-ENDLIST\n"
+        assert _parse_master(playlist, "https://cdn.example") == []
+
+
+class TestDecryptionKey:
+    """Test suite for the cached MegaCloud key"""
+
+    @pytest.fixture(autouse=True)
+    def clear_key(self):
+        MegaCloudExtractor._key_cache.clear()
+        yield
+        MegaCloudExtractor._key_cache.clear()
+
+    def test_key_fetched_once(self):
+        """Test concurrent and repeat lookups share a single keys.json fetch"""
+        extractor = MegaCloudExtractor()
+        extractor._fetch_key = AsyncMock(return_value="secret")
+
+        async def run():
+            first = await asyncio.gather(*[extractor._request_new_key() for _ in range(5)])
+            return first + [await extractor._request_new_key()]
+
+        assert asyncio.run(run()) == ["secret"] * 6
+        assert extractor._fetch_key.await_count == 1
+
+    def test_key_shared_between_instances(self):
+        """Test the key is cached per process, not per extractor"""
+        fetch = AsyncMock(return_value="secret")
+        first, second = MegaCloudExtractor(), MegaCloudExtractor()
+        first._fetch_key = second._fetch_key = fetch
+
+        asyncio.run(first._request_new_key())
+        asyncio.run(second._request_new_key())
+
+        assert fetch.await_count == 1
+
+
+class TestExtractCache:
+    """Test suite for sharing MegaCloud extractions"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        MegaCloudExtractor._extract_cache.clear()
+        yield
+        MegaCloudExtractor._extract_cache.clear()
+
+    def test_concurrent_extractions_coalesce(self):
+        """Test simultaneous requests for one embed URL run a single extraction"""
+        extractor = MegaCloudExtractor()
+        extractor._get_video_dto = AsyncMock(return_value=[{"m3u8": "https://cdn/master.m3u8", "subtitles": []}])
+        extractor._extract_qualities = AsyncMock(return_value=[])
+
+        async def run():
+            return await asyncio.gather(*[
+                extractor.extract("https://megacloud.blog/embed-2/v3/e-1/abc", "sub", "HD-1")
+                for _ in range(5)
+            ])
+
+        results = asyncio.run(run())
+
+        assert all(r == results[0] for r in results)
+        assert results[0][0]["url"] == "https://cdn/master.m3u8"
+        assert extractor._get_video_dto.await_count == 1
+
+    def test_keyed_on_type_and_server(self):
+        """Test the same embed URL under another label is extracted separately"""
+        extractor = MegaCloudExtractor()
+        extractor._get_video_dto = AsyncMock(return_value=[{"m3u8": "https://cdn/master.m3u8", "subtitles": []}])
+        extractor._extract_qualities = AsyncMock(return_value=[])
+
+        asyncio.run(extractor.extract("https://megacloud.blog/embed-2/v3/e-1/abc", "sub", "HD-1"))
+        result = asyncio.run(extractor.extract("https://megacloud.blog/embed-2/v3/e-1/abc", "dub", "HD-2"))
+
+        assert result[0]["quality"] == "HD-2 - Auto - dub"
+        assert extractor._get_video_dto.await_count == 2
+
+    def test_failures_not_cached(self):
+        """Test a failed extraction is retried on the next request"""
+        extractor = MegaCloudExtractor()
+        extractor._get_video_dto = AsyncMock(side_effect=Exception("Failed to extract nonce"))
+
+        asyncio.run(extractor.extract("https://megacloud.blog/embed-2/v3/e-1/abc", "sub", "HD-1"))
+        asyncio.run(extractor.extract("https://megacloud.blog/embed-2/v3/e-1/abc", "sub", "HD-1"))
+
+        assert extractor._get_video_dto.await_count == 2
+
+
+EMBED_URL = "https://megacloud.blog/embed-2/v3/e-1/abc123?k=1"
+
+MASTER_PLAYLIST = (
+    "#EXTM3U\n"
+    "#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\n"
+    "360/index.m3u8\n"
+    "#EXT-X-STREAM-INF:BANDWIDTH=2800000,RESOLUTION=1920x1080\n"
+    "1080/index.m3u8\n"
+)
+
+MEDIA_PLAYLIST = (
+    "#EXTM3U\n"
+    "#EXT-X-TARGETDURATION:10\n"
+    + "#EXTINF:10,\nseg.ts\n" * 500
+    + "#EXT-X-ENDLIST\n"
+)
+
+
+def mock_megacloud(monkeypatch, sources, decrypt_stats=None, decrypt_post=True, post_reply=(405, "")):
+    """
+    Serve the MegaCloud flow from canned responses; returns the list of requested URLs.
+    `decrypt_stats` collects the peak number of decrypt calls in flight and their
+    payloads. With `decrypt_post` off, the decrypt API only answers GET requests
+    and replies to a POST with the `post_reply` status and body.
+    """
+    requested = []
+    in_flight = 0
+
+    async def handler(request):
+        nonlocal in_flight
+        url = str(request.url)
+        requested.append(url)
+        if "/getSources" in url:
+            return httpx.Response(200, content=orjson.dumps(sources))
+        if url.startswith(EMBED_URL):
+            # Embed pages are slow; other requests may run meanwhile
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, text=f'<script>window._k = "{NONCE48}";</script>')
+        if url.startswith(MegaCloudExtractor.KEYS_URL):
+            return httpx.Response(200, content=orjson.dumps({"mega": "secret"}))
+        if url.startswith(MegaCloudExtractor.MEGACLOUD_API):
+            if request.method == "POST":
+                if not decrypt_post:
+                    return httpx.Response(post_reply[0], text=post_reply[1])
+                payload = orjson.loads(request.content)
+            else:
+                payload = dict(request.url.params)
+            if decrypt_stats is not None:
+                decrypt_stats.setdefault("payloads", []).append((request.method, payload))
+                in_flight += 1
+                decrypt_stats["peak"] = max(decrypt_stats.get("peak", 0), in_flight)
+                await asyncio.sleep(0.005)
+                in_flight -= 1
+            if payload["encrypted_data"] == "BROKEN":
+                return httpx.Response(200, text="{}")
+            return httpx.Response(200, text='{"success":true,"data":{"file":"https://cdn.example/hls/master.m3u8"}}')
+        if url.endswith("master.m3u8"):
+            return httpx.Response(200, text=MASTER_PLAYLIST)
+        if url.endswith(".m3u8"):
+            return httpx.Response(200, text=MEDIA_PLAYLIST)
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(megacloud_extractor, "get_client", AsyncMock(return_value=client))
+    return requested
+
+
+class TestMegaCloudExtract:
+    """Test suite for the MegaCloud extraction flow"""
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self, monkeypatch):
+        caches = (
+            MegaCloudExtractor._key_cache,
+            MegaCloudExtractor._extract_cache,
+            MegaCloudExtractor._playlist_cache,
+        )
+        for c in caches:
+            c.clear()
+        yield
+        for c in caches:
+            c.clear()
+
+    def test_plain_sources(self, monkeypatch):
+        """Test unencrypted sources are expanded into one video per variant"""
+        requested = mock_megacloud(monkeypatch, {
+            "sources": [{"file": "https://cdn.example/hls/master.m3u8"}],
+            "encrypted": False,
+            "tracks": [{"file": "https://cdn.example/en.vtt", "label": "English", "kind": "captions"}],
+        })
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert [v["quality"] for v in videos] == ["HD-1 - 640x360 - sub", "HD-1 - 1920x1080 - sub"]
+        assert videos[1]["url"] == "https://cdn.example/hls/1080/index.m3u8"
+        assert videos[0]["subtitles"] == [{"url": "https://cdn.example/en.vtt", "label": "English"}]
+        assert videos[0]["referer"] == "https://megacloud.blog/"
+        assert any(f"getSources?id=abc123&_k={NONCE48}" in u for u in requested)
+
+    def test_encrypted_sources(self, monkeypatch):
+        """Test encrypted sources are decrypted with the fetched key"""
+        stats = {}
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_stats=stats)
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "dub", "HD-2"))
+
+        assert len(videos) == 2
+        assert stats["payloads"] == [
+            ("POST", {"encrypted_data": "ENCRYPTEDBLOB", "nonce": NONCE48, "secret": "secret"}),
+        ]
+
+    def test_decrypt_falls_back_to_get(self, monkeypatch):
+        """Test a decrypt API that refuses POST is called with a query string from then on"""
+        stats = {}
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_stats=stats, decrypt_post=False)
+
+        extractor = MegaCloudExtractor()
+        videos = asyncio.run(extractor.extract(EMBED_URL, "sub", "HD-1"))
+
+        assert len(videos) == 2
+        assert stats["payloads"] == [
+            ("GET", {"encrypted_data": "ENCRYPTEDBLOB", "nonce": NONCE48, "secret": "secret"}),
+        ]
+        assert extractor._decrypt_post is False
+
+    @pytest.mark.parametrize("post_reply", [
+        (400, '{"error":"missing encrypted_data"}'),
+        (200, '{"success":false,"error":"missing encrypted_data"}'),
+    ])
+    def test_decrypt_get_after_post_error(self, monkeypatch, post_reply):
+        """Test a POST answered with an error instead of a file URL is retried as a GET"""
+        requested = mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_post=False, post_reply=post_reply)
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert len(videos) == 2
+        assert any(url.startswith(f"{MegaCloudExtractor.MEGACLOUD_API}?") for url in requested)
+
+    def test_decrypt_fallback_per_instance(self, monkeypatch):
+        """Test falling back to GET on one extractor leaves others POSTing"""
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_post=False)
+        asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        stats = {}
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_stats=stats)
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-2"))
+
+        assert len(videos) == 2
+        assert [method for method, _ in stats["payloads"]] == ["POST"]
+
+    def test_failed_source_dropped(self, monkeypatch):
+        """Test a source that can't be decrypted is skipped while the rest are kept"""
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "BROKEN"}, {"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        })
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert [v["quality"] for v in videos] == ["HD-1 - 640x360 - sub", "HD-1 - 1920x1080 - sub"]
+
+    def test_all_sources_failing(self, monkeypatch):
+        """Test extraction comes back empty when no source can be decrypted"""
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "BROKEN"}],
+            "encrypted": True,
+            "tracks": [],
+        })
+
+        assert asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1")) == []
+
+    def test_decrypt_calls_bounded(self, monkeypatch):
+        """Test no more than DECRYPT_CONCURRENCY decrypt calls run at once"""
+        stats = {}
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": f"ENCRYPTED{i}"} for i in range(20)],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_stats=stats)
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert len(videos) == 40
+        assert 1 < stats["peak"] <= MegaCloudExtractor.DECRYPT_CONCURRENCY
+
+    def test_cancelled_extract_frees_decrypt_slots(self, monkeypatch):
+        """Test cancelling an extraction mid-decrypt gives its decrypt slots back"""
+        stats = {}
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": f"ENCRYPTED{i}"} for i in range(20)],
+            "encrypted": True,
+            "tracks": [],
+        }, decrypt_stats=stats)
+        extractor = MegaCloudExtractor()
+
+        async def run():
+            task = asyncio.create_task(extractor.extract(EMBED_URL, "sub", "HD-1"))
+            while not stats.get("payloads"):
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert extractor._decrypt_limiter.active == 0
+            return await extractor.extract(EMBED_URL, "sub", "HD-1")
+
+        assert len(asyncio.run(run())) == 40
+
+    def test_variant_url_not_fetched(self, monkeypatch):
+        """Test a source that is already a variant playlist is used as is without fetching it"""
+        requested = mock_megacloud(monkeypatch, {
+            "sources": [{"file": "https://cdn.example/hls/index-f1-v1-a1.m3u8"}],
+            "encrypted": False,
+            "tracks": [],
+        })
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert [(v["quality"], v["url"]) for v in videos] == [
+            ("HD-1 - Auto - sub", "https://cdn.example/hls/index-f1-v1-a1.m3u8"),
+        ]
+        assert not any(u.endswith(".m3u8") for u in requested)
+
+    def test_media_playlist_gives_auto(self, monkeypatch):
+        """Test a media playlist behind a generic URL falls back to a single Auto entry"""
+        mock_megacloud(monkeypatch, {
+            "sources": [{"file": "https://cdn.example/hls/playlist.m3u8"}],
+            "encrypted": False,
+            "tracks": [],
+        })
+
+        videos = asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        assert [v["quality"] for v in videos] == ["HD-1 - Auto - sub"]
+
+    def test_master_playlist_cached(self, monkeypatch):
+        """Test a master playlist is parsed once for repeat extractions"""
+        requested = mock_megacloud(monkeypatch, {
+            "sources": [{"file": "https://cdn.example/hls/master.m3u8"}],
+            "encrypted": False,
+            "tracks": [],
+        })
+
+        async def run():
+            first = await MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1")
+            second = await MegaCloudExtractor().extract(EMBED_URL, "dub", "HD-1")
+            return first, second
+
+        first, second = asyncio.run(run())
+
+        assert [v["url"] for v in first] == [v["url"] for v in second]
+        assert sum(u.endswith("master.m3u8") for u in requested) == 1
+
+    def test_key_fetched_alongside_embed(self, monkeypatch):
+        """Test the key request starts before the sources request"""
+        requested = mock_megacloud(monkeypatch, {
+            "sources": [{"file": "ENCRYPTEDBLOB"}],
+            "encrypted": True,
+            "tracks": [],
+        })
+
+        asyncio.run(MegaCloudExtractor().extract(EMBED_URL, "sub", "HD-1"))
+
+        keys = requested.index(MegaCloudExtractor.KEYS_URL)
+        sources = next(i for i, u in enumerate(requested) if "/getSources" in u)
+        assert keys < sources
+
+
+STREAMTAPE_HTML = """
+<html><body>
+<div id="robotlink"></div>
+<script>
+document.getElementById('norobotlink').innerHTML = '//streamtape.com/get_video?id=decoy' + ('xcdx');
+document.getElementById('robotlink').innerHTML = '//streamtape.com/get_video?id=xyz&expires=1' + ('xcd&ip=2&token=abc').substring(1);
+</script>
+</body></html>
+"""
+
+
+def mock_streamtape(monkeypatch, html):
+    """Serve every StreamTape request with `html`; returns the list of requested URLs"""
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(200, text=html)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(streamtape_extractor, "get_client", AsyncMock(return_value=client))
+    return requested
+
+
+class TestStreamTapeExtract:
+    """Test suite for the StreamTape extractor"""
+
+    def test_robotlink(self, monkeypatch):
+        """Test the video URL is assembled from the robotlink script"""
+        requested = mock_streamtape(monkeypatch, STREAMTAPE_HTML)
+
+        video = asyncio.run(StreamTapeExtractor().extract("https://streamtape.to/v/xyz/name.mp4", "Streamtape - sub"))
+
+        assert requested == ["https://streamtape.com/e/xyz"]
+        assert video == {
+            "quality": "Streamtape - sub",
+            "url": "https://streamtape.com/get_video?id=xyz&expires=1&ip=2&token=abc",
+            "subtitles": [],
+        }
+
+    def test_without_second_part(self, monkeypatch):
+        """Test a robotlink assignment without the xcd suffix is used as is"""
+        mock_streamtape(monkeypatch, "<script>document.getElementById('robotlink').innerHTML = '//streamtape.com/get_video?id=xyz';</script>")
+
+        video = asyncio.run(StreamTapeExtractor().extract("https://streamtape.com/e/xyz"))
+
+        assert video["url"] == "https://streamtape.com/get_video?id=xyz"
+
+    def test_no_robotlink(self, monkeypatch):
+        """Test pages without the robotlink script give no video"""
+        mock_streamtape(monkeypatch, "<html><body>Video not found</body></html>")
+
+        assert asyncio.run(StreamTapeExtractor().extract("https://streamtape.com/e/xyz")) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
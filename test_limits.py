@@ -0,0 +1,134 @@
+"""
+Test limits on outbound upstream requests
+"""
+import asyncio
+import pytest
+import time
+from limits import ConcurrencyLimiter, RateLimiter, HostRateLimiter
+
+
+class TestConcurrencyLimiter:
+    """Test suite for the resizable concurrency limiter"""
+    
+    def test_caps_in_flight(self):
+        """Test no more than `limit` holders run at once"""
+        limiter = ConcurrencyLimiter(3)
+        peak = 0
+        
+        async def work():
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.active)
+                await asyncio.sleep(0.01)
+        
+        async def run():
+            await asyncio.gather(*[work() for _ in range(10)])
+        
+        asyncio.run(run())
+        
+        assert peak == 3
+        assert limiter.active == 0
+    
+    def test_raising_limit_wakes_waiters(self):
+        """Test waiters blocked on a full limiter proceed once it is raised"""
+        limiter = ConcurrencyLimiter(1)
+        
+        async def run():
+            await limiter.acquire()
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            
+            limiter.set_limit(2)
+            await asyncio.wait_for(waiter, 1)
+            return limiter.active
+        
+        assert asyncio.run(run()) == 2
+    
+    def test_cancelled_holders_free_slots(self):
+        """Test cancelled holders, and a waiter cancelled right after being handed a slot, leak nothing"""
+        limiter = ConcurrencyLimiter(1)
+        
+        async def hold():
+            async with limiter:
+                await asyncio.sleep(1)
+        
+        async def run():
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            holder.cancel()
+            await asyncio.gather(holder, return_exceptions=True)
+            await asyncio.wait_for(waiter, 1)
+            assert limiter.active == 1
+            
+            # Release hands the slot over at once; cancel the waiter before it runs
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            limiter.release()
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            return limiter.active
+        
+        assert asyncio.run(run()) == 0
+    
+    def test_invalid_limit(self):
+        """Test a limit below 1 is rejected"""
+        with pytest.raises(ValueError):
+            ConcurrencyLimiter(0)
+
+
+class TestRateLimiter:
+    """Test suite for the token bucket rate limiter"""
+    
+    def test_burst_then_paced(self):
+        """Test a full bucket is spent at once and later calls wait for refills"""
+        limiter = RateLimiter(rate=50, burst=3)
+        
+        async def run():
+            start = time.monotonic()
+            stamps = []
+            for _ in range(6):
+                await limiter.acquire()
+                stamps.append(time.monotonic() - start)
+            return stamps
+        
+        stamps = asyncio.run(run())
+        
+        assert stamps[2] < 0.02
+        # Three more tokens at 50/s take about 60ms to refill
+        assert stamps[5] >= 0.05
+    
+    def test_invalid_rate(self):
+        """Test a rate of zero is rejected"""
+        with pytest.raises(ValueError):
+            RateLimiter(0)
+
+
+class TestHostRateLimiter:
+    """Test suite for per-host rate limits"""
+    
+    def test_hosts_limited_separately(self):
+        """Test one host's spent bucket doesn't slow another host"""
+        limiter = HostRateLimiter(default_rate=1)
+        
+        async def run():
+            await limiter.acquire("a.example")
+            start = time.monotonic()
+            await limiter.acquire("b.example")
+            return time.monotonic() - start
+        
+        assert asyncio.run(run()) < 0.05
+    
+    def test_per_host_rates(self):
+        """Test listed hosts get their own rate and others the default"""
+        limiter = HostRateLimiter(default_rate=10, rates={"raw.githubusercontent.com": 2})
+        
+        assert limiter.for_host("raw.githubusercontent.com").rate == 2
+        assert limiter.for_host("megacloud.blog").rate == 10
+        assert limiter.for_host("megacloud.blog") is limiter.for_host("megacloud.blog")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,468 @@
+"""
+Test HTML parsing of HiAnime pages with canned upstream responses
+"""
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock
+from hianime import HiAnime, _find_server_id
+
+
+LISTING_HTML = """
+<html><body>
+<div class="film_list-wrap">
+  <div class="flw-item">
+    <div class="film-poster"><img data-src="https://img.example/boruto.jpg" class="film-poster-img"></div>
+    <div class="film-detail">
+      <h3 class="film-name"><a href="/boruto-naruto-next-generations-8143?ref=search" title="Boruto: Naruto Next Generations" data-jname="Boruto: Naruto Next Generations">Boruto</a></h3>
+    </div>
+  </div>
+  <div class="flw-item">
+    <div class="film-poster"><img data-src="https://img.example/naruto.jpg"></div>
+    <div class="film-detail">
+      <h3 class="film-name"><a href="/naruto-677" title="Naruto">Naruto</a></h3>
+    </div>
+  </div>
+  <div class="flw-item"><div class="film-detail"></div></div>
+</div>
+<ul class="pagination">
+  <li class="page-item"><a class="page-link" title="Next" href="?page=2">&rsaquo;</a></li>
+</ul>
+</body></html>
+"""
+
+DETAILS_HTML = """
+<html><body>
+<div class="anisc-poster"><div class="film-poster"><img src="https://img.example/poster.jpg"></div></div>
+<div class="anisc-detail"><h2 class="film-name dynamic-name" data-jname="Boruto JP">Boruto: Naruto Next Generations</h2></div>
+<div class="anisc-info">
+  <div class="item item-title w-hide"><span class="item-head">Overview:</span><div class="text">The next generation.</div></div>
+  <div class="item item-title"><span class="item-head">Japanese:</span> <span class="name">BORUTO</span></div>
+  <div class="item item-title"><span class="item-head">Aired:</span> <span class="name">Apr 5, 2017 to Mar 26, 2023</span></div>
+  <div class="item item-title"><span class="item-head">Status:</span> <span class="name">Finished Airing</span></div>
+  <div class="item item-list"><span class="item-head">Genres:</span> <a href="/genre/action">Action</a> <a href="/genre/adventure">Adventure</a></div>
+  <div class="item item-title"><span class="item-head">Studios:</span><a class="name" href="/producer/pierrot">Pierrot</a></div>
+</div>
+</body></html>
+"""
+
+EPISODES_HTML = """
+<div class="ss-list">
+  <a title="Second" class="ssl-item ep-item" data-number="2" data-id="102" href="/watch/boruto-8143?ep=1002"></a>
+  <a title="First" class="ssl-item ep-item" data-number="1" data-id="101" href="/watch/boruto-8143?ep=1001"></a>
+  <a title="Filler" class="ssl-item ep-item ssl-item-filler" data-number="1.5" data-id="150" href="/watch/boruto-8143?ep=1015"></a>
+</div>
+"""
+
+SERVERS_HTML = """
+<div class="player-servers">
+  <div class="ps_-block ps_-block-sub servers-sub">
+    <div class="ps__-list">
+      <div class="item server-item" data-type="sub" data-id="5001" data-server-id="4"><a href="javascript:;" class="btn">HD-1</a></div>
+      <div class="item server-item" data-type="sub" data-id="5002" data-server-id="1"><a href="javascript:;" class="btn">HD-2</a></div>
+      <div class="item server-item" data-type="sub" data-id="5003" data-server-id="9"><a href="javascript:;" class="btn">Vidstreaming</a></div>
+    </div>
+  </div>
+  <div class="ps_-block ps_-block-sub servers-dub">
+    <div class="ps__-list">
+      <div class="item server-item" data-type="dub" data-id="6001" data-server-id="4"><a href="javascript:;" class="btn">HD-1</a></div>
+      <div class="item server-item" data-type="dub" data-id="6004" data-server-id="3"><a href="javascript:;" class="btn">StreamTape</a></div>
+    </div>
+  </div>
+</div>
+"""
+
+
+@pytest.fixture(params=["lexbor", "lxml"])
+def hianime(request, monkeypatch):
+    """HiAnime instance with network access mocked out, once per parser backend"""
+    if request.param == "lxml":
+        monkeypatch.setattr("hianime.LexborHTMLParser", None)
+    return HiAnime()
+
+
+class TestParsing:
+    """Test suite for scraping HiAnime HTML"""
+
+    def test_listing_cards(self, hianime):
+        """Test anime cards and pagination are parsed from a listing page"""
+        hianime._fetch = AsyncMock(return_value=LISTING_HTML)
+
+        result = asyncio.run(hianime.get_popular(1))
+
+        assert result["has_next_page"] is True
+        assert result["page"] == 1
+        assert result["results"] == [
+            {
+                "id": "boruto-naruto-next-generations-8143",
+                "title": "Boruto: Naruto Next Generations",
+                "url": "/boruto-naruto-next-generations-8143",
+                "thumbnail": "https://img.example/boruto.jpg",
+            },
+            {
+                "id": "naruto-677",
+                "title": "Naruto",
+                "url": "/naruto-677",
+                "thumbnail": "https://img.example/naruto.jpg",
+            },
+        ]
+
+    def test_listing_card_other_layout(self, hianime):
+        """Test cards whose layout differs are still parsed via CSS selectors"""
+        hianime._fetch = AsyncMock(return_value="""
+            <div class="flw-item"><div class="inner">
+              <div class="film-poster"><img data-src="https://img.example/x.jpg"></div>
+              <div class="film-detail"><a href="/x-1" data-jname="X">X</a></div>
+            </div></div>
+        """)
+
+        result = asyncio.run(hianime.get_latest(1))
+
+        assert result["results"] == [
+            {"id": "x-1", "title": "X", "url": "/x-1", "thumbnail": "https://img.example/x.jpg"},
+        ]
+
+    def test_listing_without_next_page(self, hianime):
+        """Test has_next_page is False when there is no Next link"""
+        hianime._fetch = AsyncMock(return_value="<div class='flw-item'></div>")
+
+        result = asyncio.run(hianime.search("boruto"))
+
+        assert result["results"] == []
+        assert result["has_next_page"] is False
+
+    def test_anime_details(self, hianime):
+        """Test the info section is parsed into the details dict"""
+        hianime._fetch = AsyncMock(return_value=DETAILS_HTML)
+
+        result = asyncio.run(hianime.get_anime_details("boruto-8143"))
+
+        assert result["title"] == "Boruto: Naruto Next Generations"
+        assert result["japanese_title"] == "Boruto JP"
+        assert result["thumbnail"] == "https://img.example/poster.jpg"
+        assert result["status"] == "Completed"
+        assert result["studios"] == "Pierrot"
+        assert result["genres"] == "Action, Adventure"
+        assert result["description"] == (
+            "The next generation."
+            "\nAired: Apr 5, 2017 to Mar 26, 2023"
+            "\nJapanese: BORUTO"
+        )
+
+    def test_anime_details_not_found(self, hianime):
+        """Test a page without a title is reported as not found"""
+        hianime._fetch = AsyncMock(return_value="<html><body></body></html>")
+
+        result = asyncio.run(hianime.get_anime_details("missing-1"))
+
+        assert "not found" in result["error"]
+
+    def test_episodes_sorted(self, hianime):
+        """Test episodes are parsed, flagged as filler and sorted by number"""
+        hianime._fetch_json = AsyncMock(return_value={"html": EPISODES_HTML})
+
+        result = asyncio.run(hianime.get_episodes("boruto-8143"))
+
+        assert result["total_episodes"] == 3
+        assert [ep["number"] for ep in result["episodes"]] == [1.0, 1.5, 2.0]
+        assert [ep["id"] for ep in result["episodes"]] == ["1001", "1015", "1002"]
+        assert [ep["is_filler"] for ep in result["episodes"]] == [False, True, False]
+        assert result["episodes"][0]["title"] == "Ep. 1: First"
+
+    def test_episode_servers(self, hianime):
+        """Test servers are bucketed by type and unknown hosters skipped"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+
+        result = asyncio.run(hianime.get_episode_servers("1001"))
+
+        servers = result["servers"]
+        assert [s["name"] for s in servers["sub"]] == ["HD-1", "HD-2"]
+        assert [s["id"] for s in servers["dub"]] == ["6001", "6004"]
+        assert servers["raw"] == []
+        assert servers["mixed"] == []
+
+    def test_episode_servers_type_filter(self, hianime):
+        """Test type_filter only returns servers for that type"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+
+        result = asyncio.run(hianime.get_episode_servers("1001", "dub"))
+
+        assert result["servers"]["sub"] == []
+        assert [s["name"] for s in result["servers"]["dub"]] == ["HD-1", "StreamTape"]
+
+
+
+class TestGetVideo:
+    """Test suite for picking a server and extracting its video"""
+
+    def test_requested_server(self, hianime):
+        """Test the requested server's sources are fetched and extracted"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+        hianime._get_json = AsyncMock(return_value={"link": "https://megacloud.blog/embed-2/v3/e-1/abc?k=1"})
+        hianime.megacloud_extractor.extract = AsyncMock(return_value=[{"url": "m3u8"}])
+
+        result = asyncio.run(hianime.get_video("1001", "HD-2", "sub"))
+
+        assert "id=5002" in hianime._get_json.await_args.args[0]
+        hianime.megacloud_extractor.extract.assert_awaited_once_with(
+            "https://megacloud.blog/embed-2/v3/e-1/abc?k=1", "sub", "HD-2"
+        )
+        assert result["type"] == "sub"
+        assert result["videos"] == [{"url": "m3u8"}]
+
+    def test_falls_back_to_other_type(self, hianime):
+        """Test a server missing for the requested type is taken from another type"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+        hianime._get_json = AsyncMock(return_value={"link": "https://streamtape.com/e/xyz"})
+        hianime.streamtape_extractor.extract = AsyncMock(return_value={"url": "mp4"})
+
+        result = asyncio.run(hianime.get_video("1001", "StreamTape", "sub"))
+
+        assert "id=6004" in hianime._get_json.await_args.args[0]
+        assert result["type"] == "dub"
+        assert result["videos"] == [{"url": "mp4"}]
+
+    def test_server_not_found(self, hianime):
+        """Test an unknown server reports the servers that are available"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+
+        result = asyncio.run(hianime.get_video("1001", "HD-3", "sub"))
+
+        assert "not found" in result["error"]
+        assert [s["name"] for s in result["available_servers"]["sub"]] == ["HD-1", "HD-2"]
+
+    def test_invalid_episode(self, hianime):
+        """Test an invalid episode ID is reported instead of raising"""
+        result = asyncio.run(hianime.get_video("abc", "HD-1", "sub"))
+
+        assert "Invalid episode ID" in result["error"]
+
+    def test_unexpected_markup_uses_parser(self, hianime):
+        """Test a fragment the regex can't read is still resolved through the parser"""
+        html = SERVERS_HTML.replace('data-id="5002"', "data-id='5002'")
+        hianime._fetch_json = AsyncMock(return_value={"html": html})
+        hianime._get_json = AsyncMock(return_value={"link": "https://megacloud.blog/embed-2/v3/e-1/abc?k=1"})
+        hianime.megacloud_extractor.extract = AsyncMock(return_value=[{"url": "m3u8"}])
+
+        assert _find_server_id(html, "HD-2", "sub") is None
+        result = asyncio.run(hianime.get_video("1001", "HD-2", "sub"))
+
+        assert "id=5002" in hianime._get_json.await_args.args[0]
+        assert result["videos"] == [{"url": "m3u8"}]
+
+    def test_source_link_cached(self, hianime):
+        """Test a resolved source link is reused for the same server"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+        hianime._get_json = AsyncMock(return_value={"link": "https://megacloud.blog/embed-2/v3/e-1/abc?k=1"})
+        hianime.megacloud_extractor.extract = AsyncMock(return_value=[{"url": "m3u8"}])
+
+        async def run():
+            await hianime.get_video("1001", "HD-2", "sub")
+            return await hianime.get_video("1001", "HD-2", "sub")
+
+        result = asyncio.run(run())
+
+        assert hianime._get_json.await_count == 1
+        assert result["source_link"] == "https://megacloud.blog/embed-2/v3/e-1/abc?k=1"
+
+    def test_missing_source_link_not_cached(self, hianime):
+        """Test an empty source link is retried on the next request"""
+        hianime._fetch_json = AsyncMock(return_value={"html": SERVERS_HTML})
+        hianime._get_json = AsyncMock(return_value={})
+
+        async def run():
+            await hianime.get_video("1001", "HD-2", "sub")
+            return await hianime.get_video("1001", "HD-2", "sub")
+
+        result = asyncio.run(run())
+
+        assert result["error"] == "Failed to get source link"
+        assert hianime._get_json.await_count == 2
+
+
+class TestFindServerId:
+    """Test suite for the regex server lookup"""
+
+    def test_finds_server_in_type(self):
+        """Test the server is found within its own type's block only"""
+        assert _find_server_id(SERVERS_HTML, "HD-2", "sub") == "5002"
+        assert _find_server_id(SERVERS_HTML, "HD-1", "dub") == "6001"
+        assert _find_server_id(SERVERS_HTML, "StreamTape", "sub") is None
+        assert _find_server_id(SERVERS_HTML, "HD-1", "raw") is None
+
+    def test_multiline_markup(self):
+        """Test items spread over several lines, as HiAnime serves them"""
+        html = """
+        <div class="ps_-block ps_-block-sub servers-sub">
+            <div class="ps__-list">
+                <div class="item server-item" data-type="sub" data-id="7001" data-server-id="4">
+                    <a href="javascript:;" class="btn">HD-1</a>
+                </div>
+                <div class="item server-item" data-type="sub" data-id="7003" data-server-id="1">
+                    <a href="javascript:;" class="btn">HD-3</a>
+                </div>
+            </div>
+            <div class="clearfix"></div>
+        </div>
+        """
+
+        assert _find_server_id(html, "HD-3", "sub") == "7003"
+        assert _find_server_id(html, "hd-1", "sub") == "7001"
+
+
+class TestGetStreams:
+    """Test suite for resolving several episodes at once"""
+
+    def test_resolves_each_episode(self, hianime):
+        """Test every requested episode gets a stream and missing ones are listed"""
+        hianime._fetch_json = AsyncMock(return_value={"html": EPISODES_HTML})
+        hianime.get_video = AsyncMock(side_effect=lambda ep_id, server, type: {"videos": [ep_id]})
+
+        result = asyncio.run(hianime.get_streams("boruto-8143", [2, 1, 7, 2]))
+
+        assert [s["episode"] for s in result["streams"]] == [2, 1]
+        assert [s["videos"] for s in result["streams"]] == [["1002"], ["1001"]]
+        assert result["missing_episodes"] == [7]
+        assert hianime._fetch_json.await_count == 1
+
+    def test_failed_episode_reported(self, hianime):
+        """Test one failing episode doesn't fail the others"""
+        async def get_video(ep_id, server, type):
+            if ep_id == "1002":
+                raise RuntimeError("boom")
+            return {"videos": [ep_id]}
+        hianime._fetch_json = AsyncMock(return_value={"html": EPISODES_HTML})
+        hianime.get_video = get_video
+
+        result = asyncio.run(hianime.get_streams("boruto-8143", [1, 2]))
+
+        assert result["streams"][0]["videos"] == ["1001"]
+        assert "boom" in result["streams"][1]["error"]
+
+
+def mock_upstream(hianime, handler):
+    """Route the scraper's HTTP client through a mock transport"""
+    hianime._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestUpstreamErrors:
+    """Test suite for mapping upstream HTTP failures to error dicts"""
+
+    def test_details_404(self, hianime):
+        """Test an upstream 404 is reported as not found"""
+        mock_upstream(hianime, lambda request: httpx.Response(404))
+
+        result = asyncio.run(hianime.get_anime_details("missing-1"))
+
+        assert result == {"error": "Anime 'missing-1' not found"}
+
+    def test_episodes_http_error(self, hianime):
+        """Test other upstream statuses are reported with their code"""
+        mock_upstream(hianime, lambda request: httpx.Response(502))
+
+        result = asyncio.run(hianime.get_episodes("boruto-8143"))
+
+        assert result == {"error": "Failed to fetch episodes: HTTP 502"}
+
+    def test_servers_not_json(self, hianime):
+        """Test a non-JSON body from the AJAX endpoint is reported as an error"""
+        mock_upstream(hianime, lambda request: httpx.Response(200, text="<html>challenge</html>"))
+
+        result = asyncio.run(hianime.get_episode_servers("1001"))
+
+        assert result == {"error": "Unexpected response from server"}
+
+    def test_search_connection_error(self, hianime):
+        """Test connection failures are reported instead of raised"""
+        def refuse(request):
+            raise httpx.ConnectError("connection refused")
+        mock_upstream(hianime, refuse)
+
+        result = asyncio.run(hianime.search("boruto"))
+
+        assert result["results"] == []
+        assert result["error"].startswith("Failed to connect to server")
+
+
+
+class TestCompression:
+    """Test suite for compressed upstream responses"""
+
+    def test_brotli_advertised_and_decoded(self, hianime):
+        """Test Brotli is requested and br-encoded pages are decoded"""
+        brotli = pytest.importorskip("brotli")
+
+        async def run():
+            client = await hianime._get_client()
+            accept_encoding = client.headers["Accept-Encoding"]
+            await client.aclose()
+            mock_upstream(hianime, lambda request: httpx.Response(
+                200,
+                content=brotli.compress(LISTING_HTML.encode()),
+                headers={"Content-Encoding": "br"},
+            ))
+            return accept_encoding, await hianime.get_popular(1)
+
+        accept_encoding, result = asyncio.run(run())
+
+        assert "br" in accept_encoding
+        assert len(result["results"]) == 2
+
+
+class TestDomainFailover:
+    """Test suite for rotating through mirror domains"""
+
+    def test_fails_over_to_next_domain(self, hianime):
+        """Test a network error on one domain retries on the next mirror"""
+        seen = []
+
+        def handler(request):
+            seen.append((request.url.host, request.headers.get("Referer")))
+            if request.url.host == "hianime.to":
+                raise httpx.ConnectError("connection refused")
+            return httpx.Response(200, json={"html": EPISODES_HTML})
+        mock_upstream(hianime, handler)
+
+        result = asyncio.run(hianime.get_episodes("boruto-8143"))
+
+        assert result["total_episodes"] == 3
+        assert seen == [
+            ("hianime.to", "https://hianime.to/boruto-8143"),
+            ("hianime.nz", "https://hianime.nz/boruto-8143"),
+        ]
+        assert hianime._current_domain == "hianime.nz"
+        assert hianime._domain_state["hianime.to"] > 0
+
+    def test_sticks_to_working_domain(self, hianime):
+        """Test later requests start from the last domain that worked"""
+        hosts = []
+
+        def handler(request):
+            hosts.append(request.url.host)
+            if request.url.host == "hianime.to":
+                return httpx.Response(503)
+            return httpx.Response(200, text=LISTING_HTML)
+        mock_upstream(hianime, handler)
+
+        asyncio.run(hianime.get_popular(1))
+        asyncio.run(hianime.get_popular(2))
+
+        assert hosts == ["hianime.to", "hianime.nz", "hianime.nz"]
+
+    def test_client_errors_do_not_fail_over(self, hianime):
+        """Test a 404 is returned as-is without trying other domains"""
+        hosts = []
+
+        def handler(request):
+            hosts.append(request.url.host)
+            return httpx.Response(404)
+        mock_upstream(hianime, handler)
+
+        result = asyncio.run(hianime.get_anime_details("missing-1"))
+
+        assert "not found" in result["error"]
+        assert hosts == ["hianime.to"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
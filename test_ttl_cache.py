@@ -0,0 +1,146 @@
+"""
+Test the in-process TTL cache for HiAnime API
+"""
+import asyncio
+import pytest
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Test suite for the in-process TTL cache"""
+
+    def test_concurrent_loads_coalesce(self):
+        """Test concurrent callers for one key share a single load"""
+        store = TTLCache(ttl=60)
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "page"
+
+        async def run():
+            return await asyncio.gather(*[store.get_or_load("url", load) for _ in range(10)])
+
+        assert asyncio.run(run()) == ["page"] * 10
+        assert len(calls) == 1
+
+    def test_failed_load_not_cached(self):
+        """Test a failing load propagates and is retried next time"""
+        store = TTLCache(ttl=60)
+
+        async def fail():
+            raise ValueError("upstream down")
+
+        async def ok():
+            return "page"
+
+        with pytest.raises(ValueError):
+            asyncio.run(store.get_or_load("url", fail))
+        assert asyncio.run(store.get_or_load("url", ok)) == "page"
+
+    def test_expiry(self, monkeypatch):
+        """Test entries are dropped once their TTL has passed"""
+        store = TTLCache(ttl=60)
+        store.set("url", "page")
+
+        assert store.get("url") == "page"
+        monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: 10 ** 12)
+        assert store.get("url") is None
+
+    def test_cancelled_load_retried_by_waiters(self):
+        """Test waiters start their own load when the caller running the shared one is cancelled"""
+        store = TTLCache(ttl=60)
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "page"
+
+        async def run():
+            first = asyncio.create_task(store.get_or_load("url", load))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(store.get_or_load("url", load))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await waiter
+
+        assert asyncio.run(run()) == "page"
+        assert len(calls) == 2
+        assert store.get("url") == "page"
+
+    def test_keep_filters_stored_values(self):
+        """Test values rejected by `keep` are returned but not stored"""
+        store = TTLCache(ttl=60)
+
+        async def empty():
+            return ""
+
+        assert asyncio.run(store.get_or_load("link", empty, keep=bool)) == ""
+        assert store.get("link") is None
+
+    def test_refresh_ahead(self, monkeypatch):
+        """Test an entry past the refresh point is served while it reloads in the background"""
+        store = TTLCache(ttl=100, refresh_ahead=0.8)
+        store.set("link", "old")
+        calls = []
+
+        async def load():
+            calls.append(1)
+            return "new"
+
+        async def run():
+            first = await store.get_or_load("link", load)
+            monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now + 85)
+            second = await store.get_or_load("link", load)
+            await asyncio.sleep(0)
+            return first, second
+
+        now = ttl_cache.time.monotonic()
+        assert asyncio.run(run()) == ("old", "old")
+        assert len(calls) == 1
+        assert store.get("link") == "new"
+
+    def test_concurrent_refresh_ahead_loads_once(self, monkeypatch, capsys):
+        """Test concurrent callers past the refresh point schedule a single background reload"""
+        store = TTLCache(ttl=100, refresh_ahead=0.8)
+        store.set("link", "old")
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "new"
+
+        async def run():
+            # The event loop's clock is time.monotonic too, so shift it rather than freeze it
+            monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: monotonic() + 85)
+            served = await asyncio.gather(*[store.get_or_load("link", load) for _ in range(3)])
+            await asyncio.sleep(0.02)
+            return served
+
+        monotonic = ttl_cache.time.monotonic
+        assert asyncio.run(run()) == ["old"] * 3
+        assert len(calls) == 1
+        assert store.get("link") == "new"
+        assert "refresh failed" not in capsys.readouterr().out
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted past maxsize"""
+        store = TTLCache(ttl=60, maxsize=2)
+        store.set("a", 1)
+        store.set("b", 2)
+        store.get("a")
+        store.set("c", 3)
+
+        assert store.get("a") == 1
+        assert store.get("b") is None
+        assert store.get("c") == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,120 @@
+"""
+In-process TTL cache for HiAnime API
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after `ttl` seconds.
+    `get_or_load` coalesces concurrent loads of the same key into one call.
+    With `refresh_ahead` (a fraction of `ttl`), entries older than that are
+    still served while `get_or_load` reloads them in the background.
+    """
+    
+    def __init__(self, ttl: float, maxsize: int = 256, refresh_ahead: Optional[float] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.refresh_ahead = refresh_ahead
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Keys being refreshed in the background, and the tasks doing it
+        self._refreshing: set = set()
+        self._refresh_tasks: set = set()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store `value`; it expires after `ttl` seconds, or the cache's own TTL"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        self._data.clear()
+    
+    def _needs_refresh(self, key: str) -> bool:
+        if self.refresh_ahead is None or key in self._inflight or key in self._refreshing:
+            return False
+        expires_at, _ = self._data[key]
+        return expires_at - time.monotonic() <= self.ttl * (1 - self.refresh_ahead)
+    
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          keep: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value, or await `loader()` once for all concurrent callers.
+        When `keep` is given, only values for which `keep(value)` is true are stored.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            if self._needs_refresh(key):
+                # Reserved now, since the task only registers its load once it runs
+                self._refreshing.add(key)
+                task = asyncio.create_task(self._refresh(key, loader, keep))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return value
+        
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None:
+                return await self._load(key, loader, keep)
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only this caller's cancellation propagates; if the caller
+                # running the shared load was cancelled, load it ourselves
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+    
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                    keep: Optional[Callable[[Any], bool]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so a load nobody else waited on isn't logged
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if keep is None or keep(value):
+                self.set(key, value)
+            return value
+        finally:
+            # A load started while this one ran may have replaced our future
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+    
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]],
+                       keep: Optional[Callable[[Any], bool]]) -> None:
+        try:
+            # A caller may have started a load since the refresh was scheduled
+            if key not in self._inflight:
+                await self._load(key, loader, keep)
+        except Exception as e:
+            print(f"Cache refresh failed for {key}: {e}")
+        finally:
+            self._refreshing.discard(key)